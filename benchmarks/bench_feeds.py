@@ -0,0 +1,171 @@
+"""Benchmarks of the feed parsers, the DhmzData lookups and the weather forecast."""
+from contextlib import contextmanager
+from datetime import datetime
+from io import BytesIO
+import os
+from unittest.mock import patch
+
+from generate_fixtures import FIXTURES_DIR, readme_names
+
+STATION = "Zagreb-Maksimir"
+REGION = "sredisnja"
+TEXT = "zg_text"
+FORECAST_STATION = "ZAGREB-MAKSIMIR"
+
+
+def fixture(name):
+    """Return the content of a fixture."""
+    with open(os.path.join(FIXTURES_DIR, name), "rb") as fixture_file:
+        return fixture_file.read()
+
+
+def _parse(parser_name, fixture_name, *args):
+    def setup():
+        from custom_components.dhmz import parser
+
+        parse = getattr(parser, parser_name)
+        body = fixture(fixture_name)
+        return lambda: parse(BytesIO(body), *args)
+    return setup
+
+
+def _parsed_feeds():
+    """Return {url: parsed fixture}, as a hub refresh does."""
+    from custom_components.dhmz import parser, sensor
+
+    return {
+        sensor.CURRENT_SITUATION_API_URL: parser.parse_current_situation(BytesIO(fixture("hrvatska_n.xml"))),
+        sensor.PRECIPITATION_API_URL: parser.parse_precipitation(BytesIO(fixture("oborina.xml"))),
+        sensor.FORECAST_TODAY_API_URL: parser.parse_forecast_daily(BytesIO(fixture("prognoza_danas.xml"))),
+        sensor.FORECAST_TOMORROW_API_URL: parser.parse_forecast_daily(BytesIO(fixture("prognoza_sutra.xml"))),
+        sensor.FORECAST_7DAYS_API_URL: parser.parse_forecast_7days(
+            BytesIO(fixture("7d_graf_i_simboli.xml")), frozenset([FORECAST_STATION])
+        ),
+    }
+
+
+def _probe():
+    from custom_components.dhmz.sensor import DhmzData
+
+    return DhmzData(None, STATION, REGION, TEXT, FORECAST_STATION)
+
+
+def setup_update():
+    """Update a new DhmzData from all feeds, which rebuilds everything."""
+    parsed = _parsed_feeds()
+    return lambda: _probe().update(parsed)
+
+
+def setup_current_situation():
+    """Look up the station in hrvatska_n.xml and oborina.xml."""
+    from custom_components.dhmz import sensor
+
+    parsed = _parsed_feeds()
+    probe = _probe()
+    current = parsed[sensor.CURRENT_SITUATION_API_URL]
+    precipitation = parsed[sensor.PRECIPITATION_API_URL]
+    return lambda: probe.current_situation(current, precipitation)
+
+
+def setup_forecast_daily():
+    """Look up the region and text in both daily forecasts."""
+    from custom_components.dhmz import sensor
+
+    parsed = _parsed_feeds()
+    probe = _probe()
+    today = parsed[sensor.FORECAST_TODAY_API_URL]
+    tomorrow = parsed[sensor.FORECAST_TOMORROW_API_URL]
+    return lambda: probe.forecast_daily(today, tomorrow)
+
+
+def setup_forecast_hourly():
+    """Look up the forecast station in the parsed 7 day forecast."""
+    from custom_components.dhmz import sensor
+
+    parsed = _parsed_feeds()
+    probe = _probe()
+    forecast = parsed[sensor.FORECAST_7DAYS_API_URL]
+    return lambda: probe.forecast_hourly(forecast)
+
+
+def _hourly():
+    """Return the HourlyForecast of the forecast station."""
+    from custom_components.dhmz import sensor
+
+    return _parsed_feeds()[sensor.FORECAST_7DAYS_API_URL][FORECAST_STATION]
+
+
+def setup_forecast_next_hours():
+    """Select the next 24 hours of the hourly forecast."""
+    hourly = _hourly()
+    moment = hourly.datetimes[0].replace(hour=12)
+    return lambda: hourly.next_hours(moment)
+
+
+def setup_forecast_daily_max():
+    """Aggregate the highest temperature of every forecast day."""
+    return _hourly().daily_max_temperature
+
+
+def reference_clock(moment):
+    """Return a datetime class whose now() is always moment."""
+
+    class ReferenceClock(datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return moment
+    return ReferenceClock
+
+
+@contextmanager
+def _weather():
+    """Yield a DhmzWeather of the fixtures, with its clock at noon of the first forecast day."""
+    from custom_components.dhmz import weather
+
+    probe = _probe()
+    probe.update(_parsed_feeds())
+    # The fixtures do not move with the clock, the forecast has to be read
+    # at a time it covers. For generated fixtures this is their
+    # REFERENCE_TIME.
+    noon = probe.get_forecast_hourly().datetimes[0].replace(hour=12)
+    with patch.object(weather, "datetime", reference_clock(noon)):
+        yield weather.DhmzWeather(None, probe, "dhmz")
+
+
+@contextmanager
+def setup_weather_forecast():
+    """Convert the hourly forecast, as on the first read after it changed."""
+    with _weather() as entity:
+        def run():
+            entity._forecast_source = None
+            return entity._get_forecast()
+        yield run
+
+
+@contextmanager
+def setup_weather_forecast_cached():
+    """Return the future part of the already converted hourly forecast."""
+    with _weather() as entity:
+        yield entity._get_forecast
+
+
+BENCHMARKS = {
+    "parse_current_situation": _parse("parse_current_situation", "hrvatska_n.xml"),
+    "parse_precipitation": _parse("parse_precipitation", "oborina.xml"),
+    "parse_forecast_daily": _parse("parse_forecast_daily", "prognoza_danas.xml"),
+    "parse_forecast_7days": _parse(
+        "parse_forecast_7days", "7d_graf_i_simboli.xml", frozenset([FORECAST_STATION])
+    ),
+    # the last city in the document, streamed to the end
+    "parse_forecast_7days_last": _parse(
+        "parse_forecast_7days", "7d_graf_i_simboli.xml", frozenset(readme_names("forecast_station_name")[-1:])
+    ),
+    "dhmz_data_update": setup_update,
+    "dhmz_data_current_situation": setup_current_situation,
+    "dhmz_data_forecast_daily": setup_forecast_daily,
+    "dhmz_data_forecast_hourly": setup_forecast_hourly,
+    "forecast_next_hours": setup_forecast_next_hours,
+    "forecast_daily_max": setup_forecast_daily_max,
+    "weather_forecast": setup_weather_forecast,
+    "weather_forecast_cached": setup_weather_forecast_cached,
+}
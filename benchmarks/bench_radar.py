@@ -0,0 +1,95 @@
+"""Benchmarks of the radar camera image processing."""
+from io import BytesIO
+
+from bench_feeds import fixture
+
+# Zagreb
+LONGITUDE = 15.98
+LATITUDE = 45.81
+
+CROP_SIZE = 300
+
+
+def _radar():
+    from custom_components.dhmz import radar
+
+    return radar, fixture("anim_kompozit.gif")
+
+
+def setup_decode():
+    """Decode the radar GIF, as for a new animation."""
+    radar, gif = _radar()
+
+    def run():
+        radar._decode_radar.cache_clear()
+        return radar.decode_radar(gif)
+    return run
+
+
+def _render(profile, crop_size=0):
+    def setup():
+        radar, gif = _radar()
+        # Decoded once per animation and shared by all cameras, this
+        # measures marking and encoding
+        return lambda: radar.render_radar(gif, True, LONGITUDE, LATITUDE, profile, crop_size)
+    return setup
+
+
+def _frames():
+    """Return the radar animation as individual PNG frames, as DHMZ serves them."""
+    from PIL import ImageSequence
+
+    radar, gif = _radar()
+    frames = []
+    for frame in ImageSequence.Iterator(radar.Image.open(BytesIO(gif))):
+        content = BytesIO()
+        frame.save(content, format="PNG")
+        frames.append(content.getvalue())
+    return radar, frames
+
+
+def setup_render_frames():
+    """Assemble the animation from frames that were all decoded before."""
+    radar, frames = _frames()
+    durations = [125] * (len(frames) - 1) + [2000]
+    return lambda: radar.render_frames(frames, durations, True, LONGITUDE, LATITUDE, "lossy")
+
+
+def setup_render_frames_new():
+    """Assemble the animation from frames that were never decoded."""
+    radar, frames = _frames()
+    durations = [125] * (len(frames) - 1) + [2000]
+
+    def run():
+        radar._decode_frame.cache_clear()
+        return radar.render_frames(frames, durations, True, LONGITUDE, LATITUDE, "lossy")
+    return run
+
+
+def setup_resize():
+    """Scale the rendered animation down for a smaller card."""
+    radar, gif = _radar()
+    image = radar.render_radar(gif, True, LONGITUDE, LATITUDE, "lossy")
+    return lambda: radar.resize_radar(image, 360, None)
+
+
+def setup_jpeg_frames():
+    """Encode the rendered animation to JPEG frames for the MJPEG stream."""
+    radar, gif = _radar()
+    image = radar.render_radar(gif, True, LONGITUDE, LATITUDE, "lossy")
+    return lambda: radar.jpeg_frames(image)
+
+
+BENCHMARKS = {
+    "radar_decode": setup_decode,
+    "radar_render_lossless": _render("lossless"),
+    "radar_render_lossy": _render("lossy"),
+    "radar_render_fast": _render("fast"),
+    "radar_render_png": _render("png"),
+    "radar_render_gif": _render("gif"),
+    "radar_render_lossy_crop": _render("lossy", CROP_SIZE),
+    "radar_render_frames": setup_render_frames,
+    "radar_render_frames_new": setup_render_frames_new,
+    "radar_resize": setup_resize,
+    "radar_jpeg_frames": setup_jpeg_frames,
+}
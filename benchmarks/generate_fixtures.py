@@ -0,0 +1,247 @@
+"""Generate the benchmark fixtures in benchmarks/fixtures.
+
+The fixtures stand in for the five DHMZ XML feeds and the radar animation.
+They follow the structure of the live documents, use the station, region
+and forecast station names listed in README.md, and are about the size of
+the live documents. Everything is derived from a fixed seed and
+REFERENCE_TIME, so running this again gives byte-identical files. The
+fixtures are checked in, rerun this only to change them.
+
+    python benchmarks/generate_fixtures.py
+"""
+from datetime import datetime, timedelta
+from io import BytesIO
+import os
+import random
+from xml.sax.saxutils import escape, quoteattr
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+FIXTURES_DIR = os.path.join(BENCHMARKS_DIR, "fixtures")
+README = os.path.join(os.path.dirname(BENCHMARKS_DIR), "README.md")
+
+# Local time the observations in the fixtures were taken at
+REFERENCE_TIME = datetime(2026, 10, 18, 12, 0)
+
+SEED = 2026
+
+# Size of the DHMZ radar composite
+RADAR_SIZE = (600, 560)
+RADAR_FRAMES = 25
+
+SYMBOLS = [str(symbol) for symbol in range(1, 43)]
+BEARINGS = ["N", "NE", "E", "SE", "S", "SW", "W", "NW"]
+WEATHER = ["vedro", "pretežno vedro", "umjereno oblačno", "pretežno oblačno", "oblačno", "slaba kiša", "kiša", "magla"]
+
+
+def readme_names(section):
+    """Return the names listed in the section of README.md."""
+    names = []
+    with open(README, encoding="utf-8") as readme:
+        lines = iter(readme.read().splitlines())
+    for line in lines:
+        if line.strip() == "## " + section:
+            break
+    for line in lines:
+        if line.startswith("## "):
+            break
+        if line.startswith("    ") and line.strip():
+            names.append(line.strip())
+    return names
+
+
+def hrvatska(rnd, stations):
+    """Return hrvatska_n.xml, the current observations at every station."""
+    lines = [
+        '<?xml version="1.0" encoding="UTF-8"?>',
+        "<Hrvatska>",
+        "  <DatumTermin>",
+        "    <Datum>{:%d.%m.%Y}</Datum>".format(REFERENCE_TIME),
+        "    <Termin>{}</Termin>".format(REFERENCE_TIME.hour),
+        "  </DatumTermin>",
+    ]
+    for name in stations:
+        symbol = rnd.choice(SYMBOLS[:14])
+        lines += [
+            '  <Grad autom="{}">'.format(rnd.randrange(2)),
+            "    <GradIme>{}</GradIme>".format(escape(name)),
+            "    <Lat>{:.3f}</Lat>".format(rnd.uniform(42.4, 46.5)),
+            "    <Lon>{:.3f}</Lon>".format(rnd.uniform(13.5, 19.4)),
+            "    <Podatci>",
+            "      <Temp> {:.1f}</Temp>".format(rnd.uniform(4, 22)),
+            "      <Vlaga>{}</Vlaga>".format(rnd.randrange(35, 100)),
+            "      <Tlak>{:.1f}</Tlak>".format(rnd.uniform(1000, 1030)),
+            "      <TlakTend>{:+.1f}</TlakTend>".format(rnd.uniform(-2, 2)),
+            "      <VjetarSmjer>{}</VjetarSmjer>".format(rnd.choice(BEARINGS)),
+            "      <VjetarBrzina>{:.1f}</VjetarBrzina>".format(rnd.uniform(0, 12)),
+            "      <Vrijeme>{}</Vrijeme>".format(rnd.choice(WEATHER)),
+            "      <VrijemeZnak>{}</VrijemeZnak>".format(symbol),
+            "    </Podatci>",
+            "  </Grad>",
+        ]
+    lines.append("</Hrvatska>")
+    return lines
+
+
+def oborina(rnd, stations):
+    """Return oborina.xml, the 24 hour precipitation at every station."""
+    lines = [
+        '<?xml version="1.0" encoding="UTF-8"?>',
+        "<dnevna_oborina>",
+        "  <datumtermin>",
+        "    <datum>{:%d.%m.%Y}.</datum>".format(REFERENCE_TIME),
+        "    <termin>7</termin>",
+        "  </datumtermin>",
+    ]
+    for name in stations:
+        lines += [
+            "  <grad>",
+            "    <ime>{}</ime>".format(escape(name)),
+            "    <kolicina>{:.1f}</kolicina>".format(rnd.choice([0.0, 0.0, 0.0, rnd.uniform(0.1, 40)])),
+            "  </grad>",
+        ]
+    lines.append("</dnevna_oborina>")
+    return lines
+
+
+def prognoza(rnd, regions, texts, day):
+    """Return prognoza_danas.xml (day 0) or prognoza_sutra.xml (day 1)."""
+    lines = [
+        '<?xml version="1.0" encoding="UTF-8"?>',
+        "<VW>",
+        "  <metadata>",
+        "    <datatime>{:%d%m%y}</datatime>".format(REFERENCE_TIME),
+        "    <day>{}</day>".format(day),
+        "  </metadata>",
+        "  <section>",
+    ]
+    for region in regions:
+        low = rnd.randrange(0, 12)
+        lines += [
+            "    <station name={}>".format(quoteattr(region)),
+            '      <param name="vrijeme" value="{}"/>'.format(rnd.choice(SYMBOLS[:14])),
+            '      <param name="Tmn" value="{}"/>'.format(low),
+            '      <param name="Tmx" value="{}"/>'.format(low + rnd.randrange(4, 12)),
+            '      <param name="wind" value="{}{}"/>'.format(rnd.choice(BEARINGS), rnd.randrange(1, 4)),
+            "    </station>",
+        ]
+    for text in texts:
+        sentences = " ".join(
+            rnd.choice([
+                "Pretežno sunčano uz malu do umjerenu naoblaku.",
+                "Mjestimice kiša, ponegdje i pljusak s grmljavinom.",
+                "Ujutro u unutrašnjosti mjestimice magla.",
+                "Vjetar slab do umjeren sjeveroistočni, na Jadranu bura.",
+                "Najviša dnevna temperatura zraka uglavnom između 15 i 20 °C.",
+            ])
+            for _ in range(5)
+        )
+        lines.append("    <param name={} value={}/>".format(quoteattr(text), quoteattr(sentences)))
+    lines += ["  </section>", "</VW>"]
+    return lines
+
+
+def sedamdana(rnd, cities):
+    """Return 7d_graf_i_simboli.xml, the 3 hourly 7 day forecast of every city."""
+    start = REFERENCE_TIME.replace(hour=0)
+    lines = ['<?xml version="1.0" encoding="UTF-8"?>', "<sedamdana>"]
+    for city in cities:
+        lines.append("  <grad code={} ime={}>".format(quoteattr(city), quoteattr(city.title())))
+        temperature = rnd.uniform(5, 15)
+        for hours in range(0, 7 * 24, 3):
+            moment = start + timedelta(hours=hours)
+            temperature += rnd.uniform(-2, 2)
+            night = "n" if moment.hour < 6 or moment.hour > 18 else ""
+            lines.append(
+                '    <dan datum="{:%d.%m.%Y}." sat="{}"><simbol>{}{}</simbol><t_2m>{:.0f}</t_2m>'
+                "<vjetar>{}{}</vjetar><oborina>{:.1f}</oborina></dan>".format(
+                    moment, moment.hour, rnd.choice(SYMBOLS), night, temperature,
+                    rnd.choice(BEARINGS), rnd.randrange(0, 4), rnd.choice([0.0, 0.0, rnd.uniform(0.1, 8)]),
+                )
+            )
+        lines.append("  </grad>")
+    lines.append("</sedamdana>")
+    return lines
+
+
+def radar_gif(rnd):
+    """Return an animated radar composite: a map with moving precipitation echoes."""
+    from PIL import Image, ImageDraw
+
+    # white background, map lines, then a 16 step precipitation scale
+    palette = [255, 255, 255, 0, 0, 0, 128, 128, 128, 190, 215, 240]
+    for step in range(16):
+        palette += [min(255, step * 32), max(0, 255 - step * 16), max(0, 200 - step * 24)]
+    palette += [0, 0, 0] * (256 - len(palette) // 3)
+
+    width, height = RADAR_SIZE
+    base = Image.new("P", RADAR_SIZE, 0)
+    base.putpalette(palette)
+    draw = ImageDraw.Draw(base)
+    # sea, coast and borders
+    draw.polygon([(0, height), (0, 290), (125, 230), (250, 330), (390, 455), (width, 490), (width, height)], fill=3)
+    for _ in range(60):
+        x_coord, y_coord = rnd.randrange(RADAR_SIZE[0]), rnd.randrange(RADAR_SIZE[1])
+        points = [(x_coord, y_coord)]
+        for _ in range(8):
+            x_coord += rnd.randrange(-25, 26)
+            y_coord += rnd.randrange(-25, 26)
+            points.append((x_coord, y_coord))
+        draw.line(points, fill=rnd.choice((1, 2)), width=1)
+    draw.rectangle((8, 8, 200, 30), fill=0, outline=1)
+
+    cells = [
+        [rnd.uniform(0, RADAR_SIZE[0]), rnd.uniform(0, RADAR_SIZE[1]), rnd.uniform(10, 60), rnd.randrange(4, 20)]
+        for _ in range(25)
+    ]
+    frames = []
+    for index in range(RADAR_FRAMES):
+        frame = base.copy()
+        draw = ImageDraw.Draw(frame)
+        for cell in cells:
+            # echoes drift north-east and change intensity
+            cell[0] += rnd.uniform(2, 8)
+            cell[1] -= rnd.uniform(0, 5)
+            cell[3] = min(19, max(4, cell[3] + rnd.randrange(-1, 2)))
+            for ring in range(4):
+                radius = cell[2] * (1 - ring / 4)
+                draw.ellipse(
+                    (cell[0] - radius, cell[1] - radius * 0.7, cell[0] + radius, cell[1] + radius * 0.7),
+                    fill=max(4, cell[3] - 3 + ring),
+                )
+        draw.text((12, 12), "{:%d.%m.%Y %H:%M} UTC".format(REFERENCE_TIME - timedelta(minutes=5 * (RADAR_FRAMES - 1 - index))), fill=1)
+        frames.append(frame)
+
+    content = BytesIO()
+    frames[0].save(
+        content, format="GIF", save_all=True, append_images=frames[1:],
+        duration=[125] * (RADAR_FRAMES - 1) + [2000], loop=0,
+    )
+    return content.getvalue()
+
+
+def main():
+    """Write all fixtures."""
+    rnd = random.Random(SEED)
+    stations = readme_names("station_name")
+    cities = readme_names("forecast_station_name")
+    regions = readme_names("forecast_region_name")
+    texts = readme_names("forecast_text")
+
+    documents = {
+        "hrvatska_n.xml": hrvatska(rnd, stations),
+        # precipitation is also measured at rain gauges
+        "oborina.xml": oborina(rnd, stations + [city.title() for city in cities]),
+        "prognoza_danas.xml": prognoza(rnd, regions, texts, 0),
+        "prognoza_sutra.xml": prognoza(rnd, regions, texts, 1),
+        "7d_graf_i_simboli.xml": sedamdana(rnd, cities),
+    }
+    os.makedirs(FIXTURES_DIR, exist_ok=True)
+    for name, lines in documents.items():
+        with open(os.path.join(FIXTURES_DIR, name), "wb") as fixture:
+            fixture.write(("\r\n".join(lines) + "\r\n").encode("utf-8"))
+    with open(os.path.join(FIXTURES_DIR, "anim_kompozit.gif"), "wb") as fixture:
+        fixture.write(radar_gif(rnd))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+"""Run the DHMZ benchmarks and print their results as JSON.
+
+    python benchmarks/run.py [--repeat N] [--output FILE] [NAME ...]
+
+Runs every benchmark, or those whose name starts with one of the NAMEs,
+against the checked-in fixtures, without network access. Every benchmark
+runs in a fresh process: once to warm up, then timed repeat times. Its
+memory is the peak resident set size of that process, after the setup
+and after the runs, so that it includes the pixel buffers Pillow
+allocates itself, which tracemalloc does not see. The memory left
+allocated, e.g. in caches, is only counted in Python objects. Benchmarks
+whose dependencies are not installed are reported as skipped.
+
+The output has sorted keys and fixed rounding, so the results of two
+commits can be compared with a plain diff or loaded for further analysis.
+"""
+import argparse
+from contextlib import AbstractContextManager, contextmanager
+import gc
+import importlib
+from importlib import metadata
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+REPOSITORY_DIR = os.path.dirname(BENCHMARKS_DIR)
+sys.path.insert(0, REPOSITORY_DIR)
+sys.path.insert(0, BENCHMARKS_DIR)
+
+# Modules defining BENCHMARKS, {name: setup}. setup() prepares the inputs
+# and returns the function to benchmark, or a context manager yielding it
+# when something has to be undone afterwards. It raises ImportError when a
+# dependency is missing.
+MODULES = ("bench_feeds", "bench_radar")
+
+# Distributions whose versions are reported with the results
+DEPENDENCIES = ("homeassistant", "lxml", "numpy", "Pillow")
+
+DEFAULT_REPEAT = 10
+
+
+@contextmanager
+def prepare(setup):
+    """Yield the function to benchmark of setup."""
+    prepared = setup()
+    if isinstance(prepared, AbstractContextManager):
+        with prepared as run:
+            yield run
+    else:
+        yield prepared
+
+
+def max_rss_kib():
+    """Return the peak resident set size of this process, None where it is not available."""
+    if resource is None:
+        return None
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # bytes on macOS, KiB elsewhere
+    if sys.platform == "darwin":
+        max_rss //= 1024
+    return max_rss
+
+
+def measure(run, repeat):
+    """Return the wall times, peak memory and retained Python objects of run."""
+    gc.collect()
+    blocks = sys.getallocatedblocks()
+    setup_rss = max_rss_kib()
+    run()
+
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        times.append((time.perf_counter() - start) * 1000)
+
+    gc.collect()
+    retained_blocks = sys.getallocatedblocks() - blocks
+
+    return {
+        "repeat": repeat,
+        "wall_ms": {
+            "min": round(min(times), 3),
+            "median": round(statistics.median(times), 3),
+            "mean": round(statistics.mean(times), 3),
+            "max": round(max(times), 3),
+        },
+        "max_rss_kib": {
+            "setup": setup_rss,
+            "runs": max_rss_kib(),
+        },
+        "retained_blocks": retained_blocks,
+    }
+
+
+def run_benchmark(name, repeat):
+    """Return the results of the benchmark name, measured in this process."""
+    for module_name in MODULES:
+        module = importlib.import_module(module_name)
+        setup = module.BENCHMARKS.get(name)
+        if setup is None:
+            continue
+        try:
+            with prepare(setup) as run:
+                return measure(run, repeat)
+        except ImportError as err:
+            return {"skipped": str(err)}
+    raise KeyError(name)
+
+
+def run_isolated(name, repeat):
+    """Return the results of the benchmark name, measured in a fresh process."""
+    process = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--isolated", "--repeat", str(repeat), name],
+        capture_output=True, text=True, check=True,
+    )
+    return json.loads(process.stdout)
+
+
+def environment():
+    """Return the interpreter, dependency versions and commit the results were taken with."""
+    versions = {}
+    for name in DEPENDENCIES:
+        try:
+            versions[name] = metadata.version(name)
+        except metadata.PackageNotFoundError:
+            versions[name] = None
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=REPOSITORY_DIR,
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "machine": platform.machine(),
+        "python": platform.python_implementation() + " " + platform.python_version(),
+        "versions": versions,
+    }
+
+
+def main():
+    """Run the selected benchmarks and write the results."""
+    parser = argparse.ArgumentParser(description="Run the DHMZ benchmarks.")
+    parser.add_argument("names", nargs="*", help="run only benchmarks starting with these names")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT, help="timed runs per benchmark")
+    parser.add_argument("--output", help="write the JSON results to this file instead of stdout")
+    # runs the one benchmark named, in this process, for run_isolated
+    parser.add_argument("--isolated", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.isolated:
+        print(json.dumps(run_benchmark(args.names[0], args.repeat)))
+        return
+
+    results = {}
+    for module_name in MODULES:
+        module = importlib.import_module(module_name)
+        for name in module.BENCHMARKS:
+            if args.names and not name.startswith(tuple(args.names)):
+                continue
+            results[name] = run_isolated(name, args.repeat)
+            if "skipped" not in results[name]:
+                print(name, results[name]["wall_ms"]["median"], "ms", file=sys.stderr)
+
+    output = json.dumps({"environment": environment(), "benchmarks": results}, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as output_file:
+            output_file.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
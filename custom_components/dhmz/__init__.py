@@ -1 +1,21 @@
 """A component for DHMZ weather."""
+
+DOMAIN = "dhmz"
+
+
+async def async_setup(hass, config):
+    """Set up what all DHMZ platforms share: the services and the metric sensors.
+
+    Runs once, before the first DHMZ platform is set up, whichever ones are
+    configured.
+    """
+    # Imported here, the radar worker process imports this package and must
+    # not load Home Assistant
+    from homeassistant.const import Platform
+    from homeassistant.helpers.discovery import async_load_platform
+
+    from .services import async_setup_services
+
+    async_setup_services(hass)
+    hass.async_create_task(async_load_platform(hass, Platform.SENSOR, DOMAIN, {}, config))
+    return True
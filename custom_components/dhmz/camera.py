@@ -1,33 +1,76 @@
 """Provide DHMZ radar image"""
 import asyncio
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
 import logging
+import multiprocessing
 from datetime import datetime, timedelta
+import json
+import os
+import struct
 from typing import Optional
 
 import aiohttp
 import voluptuous as vol
-from io import BytesIO
-from PIL import Image, ImageDraw, ImageSequence
 
-from homeassistant.components.camera import PLATFORM_SCHEMA, Camera
-from homeassistant.const import CONF_NAME, CONF_LATITUDE, CONF_LONGITUDE
+from homeassistant.components.camera import PLATFORM_SCHEMA, Camera, async_get_still_stream
+from homeassistant.const import CONF_NAME, CONF_LATITUDE, CONF_LONGITUDE, EVENT_HOMEASSISTANT_STOP
 
 from homeassistant.helpers import config_validation as cv
 from homeassistant.helpers.aiohttp_client import async_get_clientsession
 
 from homeassistant.util import dt as dt_util
+from homeassistant.util import slugify
 from homeassistant.util import Throttle
 
+from . import DOMAIN
+from .feed import feed_digest
+from .metrics import get_metrics
+from .radar import (
+    DEFAULT_QUALITY,
+    ENCODING_PROFILES,
+    FALLBACK_PROFILES,
+    jpeg_frames,
+    profile_for_format,
+    render_frames,
+    render_radar,
+    resize_radar,
+    timed,
+)
+from .tasks import SingleFlight
+
 MIN_TIME_BETWEEN_UPDATE = timedelta(minutes=2)
 
+# shortest time a frame is shown for in the MJPEG stream, in milliseconds
+MIN_STREAM_FRAME_TIME = 50
+
 CONF_DELTA = "delta"
 CONF_PREVIOUS_TIME = "previous_images_time"
 CONF_CURRENT_TIME = "current_image_time"
 CONF_SHOW_LOCATION = "mark_location"
 CONF_IMAGE_FORMAT = "image_format"
+CONF_PROCESS_POOL = "process_pool"
+CONF_RESIZE_CACHE_SIZE = "resize_cache_size"
+CONF_INCREMENTAL_FRAMES = "incremental_frames"
+CONF_MAX_STALENESS = "max_staleness"
+CONF_CROP_SIZE = "crop_size"
+CONF_ENCODING_PROFILE = "encoding_profile"
+CONF_QUALITY = "quality"
+CONF_CPU_BUDGET = "cpu_budget"
+
+DATA_PROCESS_POOL = "radar_process_pool"
+DATA_RADAR_SOURCE = "radar_source"
+
+# Cache file layout: header length, JSON header, image
+CACHE_FILE = ".dhmz_radar_{}.cache"
+SOURCE_CACHE_FILE = ".dhmz_radar_source.cache"
+CACHE_HEADER = struct.Struct(">I")
+CACHE_VERSION = 2
 
 RADAR_MAP_URL_STATIC = "https://vrijeme.hr/kompozit-stat.png"
 RADAR_MAP_URL_ANIM = "https://prognoza.hr/karte/radar/anim_kompozit{index}.png"
+# number of frames in the animation, the last one is the newest
+RADAR_MAP_FRAMES = 25
 RADAR_MAP_URL_ANIM_GIF = "https://vrijeme.hr/anim_kompozit.gif"
 
 _LOG = logging.getLogger(__name__)
@@ -53,6 +96,24 @@ PLATFORM_SCHEMA = vol.All(
             ): cv.longitude,
             vol.Optional(CONF_SHOW_LOCATION, default=False): cv.boolean,
             vol.Optional(CONF_IMAGE_FORMAT, default="WebP"): cv.string,
+            vol.Optional(CONF_PROCESS_POOL, default=False): cv.boolean,
+            vol.Optional(CONF_RESIZE_CACHE_SIZE, default=4 * 1024 * 1024): vol.All(
+                vol.Coerce(int), vol.Range(min=0)
+            ),
+            vol.Optional(CONF_INCREMENTAL_FRAMES, default=False): cv.boolean,
+            vol.Optional(CONF_MAX_STALENESS, default=0.0): vol.All(
+                vol.Coerce(float), vol.Range(min=0)
+            ),
+            vol.Optional(CONF_CROP_SIZE, default=0): vol.All(
+                vol.Coerce(int), vol.Range(min=0)
+            ),
+            vol.Optional(CONF_ENCODING_PROFILE): vol.In(list(ENCODING_PROFILES)),
+            vol.Optional(CONF_QUALITY, default=DEFAULT_QUALITY): vol.All(
+                vol.Coerce(int), vol.Range(min=0, max=100)
+            ),
+            vol.Optional(CONF_CPU_BUDGET, default=0.0): vol.All(
+                vol.Coerce(float), vol.Range(min=0)
+            ),
         }
     )
 )
@@ -68,15 +129,327 @@ async def async_setup_platform(hass, config, async_add_entities, discovery_info=
     longitude = config.get(CONF_LONGITUDE, hass.config.longitude)
     show_location = config.get(CONF_SHOW_LOCATION)
     image_format = config.get(CONF_IMAGE_FORMAT)
+    process_pool = config.get(CONF_PROCESS_POOL)
+    resize_cache_size = config.get(CONF_RESIZE_CACHE_SIZE)
+    incremental_frames = config.get(CONF_INCREMENTAL_FRAMES)
+    max_staleness = config.get(CONF_MAX_STALENESS)
+    crop_size = config.get(CONF_CROP_SIZE)
+    encoding_profile = config.get(CONF_ENCODING_PROFILE)
+    quality = config.get(CONF_QUALITY)
+    cpu_budget = config.get(CONF_CPU_BUDGET)
+
+    async_add_entities([DhmzRadar(name, delta, previous_images_time, current_image_time, latitude, longitude, show_location, image_format, process_pool, resize_cache_size, incremental_frames, max_staleness, crop_size, encoding_profile, quality, cpu_budget)])
+
+
+def get_process_pool(hass):
+    """Return the worker process shared by all radar cameras, starting it if needed."""
+    domain_data = hass.data.setdefault(DOMAIN, {})
+    pool = domain_data.get(DATA_PROCESS_POOL)
+    if pool is None:
+        # Spawned rather than forked, forking a process running many threads
+        # is not safe. The jobs are radar module functions, so the worker
+        # imports the package and the radar module, neither of which may
+        # import Home Assistant at module level.
+        pool = domain_data[DATA_PROCESS_POOL] = ProcessPoolExecutor(
+            max_workers=1, mp_context=multiprocessing.get_context("spawn")
+        )
+
+        def shutdown(event):
+            pool.shutdown(wait=False, cancel_futures=True)
+
+        hass.bus.async_listen_once(EVENT_HOMEASSISTANT_STOP, shutdown)
+    return pool
+
+def read_cache(path):
+    """Return the header and image of a radar cache file, None if there is none."""
+    try:
+        with open(path, "rb") as cache_file:
+            content = cache_file.read()
+    except FileNotFoundError:
+        return None
+    except OSError as err:
+        _LOG.warning("Failed to read DHMZ radar cache %s: %s", path, err)
+        return None
+    try:
+        (length,) = CACHE_HEADER.unpack_from(content)
+        header = json.loads(content[CACHE_HEADER.size:CACHE_HEADER.size + length])
+    except (struct.error, ValueError) as err:
+        _LOG.warning("Ignoring corrupt DHMZ radar cache %s: %s", path, err)
+        return None
+    return header, content[CACHE_HEADER.size + length:]
+
+
+def write_cache(path, header, image):
+    """Write a radar cache file, replacing the previous one atomically."""
+    encoded = json.dumps(header).encode()
+    temp_path = path + ".tmp"
+    try:
+        with open(temp_path, "wb") as cache_file:
+            cache_file.write(CACHE_HEADER.pack(len(encoded)))
+            cache_file.write(encoded)
+            cache_file.write(image)
+        os.replace(temp_path, path)
+    except OSError as err:
+        _LOG.warning("Failed to write DHMZ radar cache %s: %s", path, err)
+
+
+def get_radar_source(hass):
+    """Return the radar source shared by all radar cameras."""
+    domain_data = hass.data.setdefault(DOMAIN, {})
+    source = domain_data.get(DATA_RADAR_SOURCE)
+    if source is None:
+        source = domain_data[DATA_RADAR_SOURCE] = DhmzRadarSource(hass)
+    return source
+
+
+class DhmzRadarSource:
+    """
+    Radar animation downloaded from DHMZ, shared by all radar cameras.
+
+    Each download runs once no matter how many cameras ask for it. The
+    cameras render their own images from gif or frames, identified by
+    gif_digest and frames_digest. Decoded frames are shared through the
+    caches in the radar module.
+    """
+
+    def __init__(self, hass):
+        """Initialize the source."""
+        self._hass = hass
+
+        # the animated GIF, its digest and validators
+        self.gif: Optional[bytes] = None
+        self.gif_digest: Optional[str] = None
+        self._last_gif_modified = None
+        self._last_gif_etag = None
+
+        # the individually fetched frames, once all of them were fetched
+        self.frames: Optional[tuple] = None
+        self.frames_digest: Optional[str] = None
+        # Initialize storage for images
+        self._images_content = [ None for i in range(RADAR_MAP_FRAMES) ]
+        self._images = [ {
+                "content_length": 0,
+                "etag": "",
+                "last_modified": None
+            } for i in range(RADAR_MAP_FRAMES) ]
+
+        # downloads in flight, by name
+        self._tasks = SingleFlight()
+        # whether the cache file was read
+        self._loaded = False
+
+    async def async_load(self) -> None:
+        """Restore the last GIF and its validators from the cache file, once."""
+        if not self._loaded:
+            await self._tasks.async_run(self._hass, "load", self._async_load)
+
+    async def _async_load(self) -> None:
+        path = self._hass.config.path(SOURCE_CACHE_FILE)
+        cache = await self._hass.async_add_executor_job(read_cache, path)
+        self._loaded = True
+        if cache is None or self.gif is not None:
+            return
+        header, gif = cache
+        if header.get("version") != CACHE_VERSION or not gif:
+            return
+        self.gif = gif
+        self.gif_digest = feed_digest(gif).hex()
+        self._last_gif_etag = header.get("etag")
+        self._last_gif_modified = header.get("last_modified")
+
+    def _async_save(self) -> None:
+        header = {
+            "version": CACHE_VERSION,
+            "etag": self._last_gif_etag,
+            "last_modified": self._last_gif_modified,
+        }
+        path = self._hass.config.path(SOURCE_CACHE_FILE)
+        self._hass.async_add_executor_job(write_cache, path, header, self.gif)
+
+    def _set_gif(self, content: bytes) -> None:
+        if content == self.gif:
+            return
+        self.gif = content
+        self.gif_digest = feed_digest(content).hex()
+        self._async_save()
+
+    async def async_fetch_gif(self) -> bool:
+        """Retrieve the animated GIF and return whether gif is current."""
+        return await self._tasks.async_run(self._hass, "gif", self._async_fetch_gif)
+
+    async def _async_fetch_gif(self) -> bool:
+        with get_metrics(self._hass).timer("radar/fetch_ms"):
+            was_updated = await self.__retrieve_radar_image()
+            if was_updated == False:
+                was_updated = await self.__retrieve_radar_image_old()
+        return was_updated and self.gif is not None
+
+    async def async_fetch_frames(self) -> bool:
+        """Retrieve changed animation frames and return whether frames are current."""
+        return await self._tasks.async_run(self._hass, "frames", self._async_fetch_frames)
+
+    async def _async_fetch_frames(self) -> bool:
+        with get_metrics(self._hass).timer("radar/fetch_ms"):
+            return await self.__retrieve_radar_frames()
+
+    async def __retrieve_radar_image_old(self) -> bool:
+        """Retrieve old radar image format (GIF) and return whether this succeeded."""
+        session = async_get_clientsession(self._hass)
+
+        if self._last_gif_modified:
+            headers = {"If-Modified-Since": self._last_gif_modified }
+        else:
+            headers = {}
+
+        _LOG.debug("GET url: %s", RADAR_MAP_URL_ANIM_GIF )
+        try:
+            res = await session.get( RADAR_MAP_URL_ANIM_GIF , timeout=5, headers=headers)
+            res.raise_for_status()
+        except (asyncio.TimeoutError, aiohttp.ClientError) as err:
+            _LOG.error("Failed to fetch get, %s", err)
+            return False
+
+        if res.status == 304:
+            _LOG.debug("GET - HTTP 304 - success")
+            return True
+
+        try:
+            current_content = await res.read()
+        except (asyncio.TimeoutError, aiohttp.ClientError) as err:
+            _LOG.error("Failed to read content, %s", err)
+            return False
+
+        last_modified = res.headers.get("last-modified")
+        if last_modified:
+            self._last_gif_modified = last_modified
+        self._set_gif(current_content)
+
+        _LOG.debug("Got image %s", RADAR_MAP_URL_ANIM_GIF )
+
+        return True
+
+    async def __retrieve_radar_frame(self, session, index) -> Optional[bool]:
+        """Retrieve one animation frame and return whether it changed, None on failure."""
+        image = self._images[index]
+        headers = {}
+        if image["last_modified"]:
+            headers["If-Modified-Since"] = image["last_modified"]
+        if image["etag"]:
+            headers["If-None-Match"] = image["etag"]
+
+        url = RADAR_MAP_URL_ANIM.format(index=index + 1)
+        try:
+            res = await session.get(url, timeout=10, headers=headers)
+            res.raise_for_status()
+            if res.status == 304:
+                return False
+            content = await res.read()
+        except (asyncio.TimeoutError, aiohttp.ClientError) as err:
+            _LOG.error("Failed to fetch DHMZ radar frame %s: %s", url, err)
+            return None
+
+        image["content_length"] = len(content)
+        image["etag"] = res.headers.get("etag") or ""
+        image["last_modified"] = res.headers.get("last-modified")
+        changed = content != self._images_content[index]
+        self._images_content[index] = content
+        return changed
+
+    async def __retrieve_radar_frames(self) -> bool:
+        """Retrieve changed animation frames and return whether this succeeded.
+
+        The frame URLs are positional, the newest frame is always the last
+        one. When DHMZ publishes a new frame, every other frame moves one
+        position towards the start. The frames are kept as a ring buffer:
+        on a new newest frame, the buffer is shifted by one and only the
+        new frame is downloaded. The shift is confirmed with a conditional
+        GET of the frame before the newest, all frames are downloaded again
+        only when that does not match, e.g. after more than one
+        publication.
+        """
+        session = async_get_clientsession(self._hass)
+
+        # Nothing else changes as long as the newest frame does not
+        newest = RADAR_MAP_FRAMES - 1
+        previous_content = list(self._images_content)
+        previous_images = [dict(image) for image in self._images]
+        changed = await self.__retrieve_radar_frame(session, newest)
+        if changed is None:
+            return False
+        if not changed and self.frames is not None:
+            _LOG.debug("DHMZ radar frames not modified")
+            return True
+
+        results = []
+        if changed and self.frames is not None:
+            # The previous newest frame is now the one before it, and so on
+            self._images_content[:newest] = previous_content[1:]
+            self._images[:newest] = previous_images[1:]
+            shifted = await self.__retrieve_radar_frame(session, newest - 1)
+            results.append(shifted)
+            if shifted:
+                _LOG.debug("DHMZ radar frames did not shift by one, fetching all of them")
+                results += await asyncio.gather(
+                    *(self.__retrieve_radar_frame(session, index) for index in range(newest - 1))
+                )
+        else:
+            results = await asyncio.gather(
+                *(self.__retrieve_radar_frame(session, index) for index in range(newest))
+            )
+        if None in results:
+            # The buffer no longer matches the frames, rebuild it next time
+            self.frames = None
+            return False
+        if changed or any(results) or self.frames is None:
+            self.frames = tuple(self._images_content)
+            self.frames_digest = feed_digest(b"".join(self.frames)).hex()
+            _LOG.debug("Got %d changed DHMZ radar frames", changed + sum(results))
+        return True
+
+    async def __retrieve_radar_image(self) -> bool:
+        """Retrieve animated GIF and return whether this succeeded."""
+        session = async_get_clientsession(self._hass)
+
+        headers = {}
+        if self._last_gif_modified:
+            headers["If-Modified-Since"] = self._last_gif_modified
+        if self._last_gif_etag:
+            headers["If-None-Match"] = self._last_gif_etag
+
+        _LOG.debug("GET url: %s", RADAR_MAP_URL_ANIM_GIF)
+        try:
+            res = await session.get(RADAR_MAP_URL_ANIM_GIF, timeout=10, headers=headers)
+            res.raise_for_status()
+        except (asyncio.TimeoutError, aiohttp.ClientError) as err:
+            _LOG.error("Failed to fetch DHMZ radar GIF: %s", err)
+            return False
+
+        metrics = get_metrics(self._hass)
+        metrics.record("radar/not_modified_ratio", res.status == 304)
+        if res.status == 304:
+            _LOG.debug("DHMZ radar GIF - HTTP 304 (not modified)")
+            return True
+
+        try:
+            current_content = await res.read()
+        except (asyncio.TimeoutError, aiohttp.ClientError) as err:
+            _LOG.error("Failed to read DHMZ radar GIF content: %s", err)
+            return False
+        metrics.record("radar/bytes", len(current_content))
+
+        # Update cache headers
+        self._last_gif_modified = res.headers.get("last-modified")
+        self._last_gif_etag = res.headers.get("etag")
+        self._set_gif(current_content)
+        return True
 
-    async_add_entities([DhmzRadar(name, delta, previous_images_time, current_image_time, latitude, longitude, show_location, image_format)])
 
 class DhmzRadar(Camera):
     """
     Rain radar imagery camera based on image URL taken from DHMZ.
     """
 
-    def __init__(self, name: str, delta: float, previous_images_time: int, current_image_time: int, latitude, longitude, show_location, image_format):
+    def __init__(self, name: str, delta: float, previous_images_time: int, current_image_time: int, latitude, longitude, show_location, image_format, process_pool=False, resize_cache_size=0, incremental_frames=False, max_staleness=0.0, crop_size=0, encoding_profile=None, quality=DEFAULT_QUALITY, cpu_budget=0.0):
         """
         Initialize the component.
 
@@ -88,6 +461,9 @@ class DhmzRadar(Camera):
 
         # time a cached image stays valid for
         self._delta = delta
+        # time past the deadline a cached image may still be served for while
+        # it is refreshed in the background, 0 to always wait for the refresh
+        self._max_staleness = max_staleness
 
         self._previous_images_time = previous_images_time
         self._current_image_time = current_image_time
@@ -96,6 +472,27 @@ class DhmzRadar(Camera):
         self._latitude = latitude
         self._show_location = show_location
         self._image_format = image_format
+        if encoding_profile is None:
+            encoding_profile = profile_for_format(image_format)
+            if encoding_profile is None:
+                _LOG.warning("Unsupported DHMZ radar image_format %s, using GIF", image_format)
+                encoding_profile = "gif"
+        self._encoding_profile = encoding_profile
+        # profile in use, cheaper than the configured one after going over
+        # the CPU time budget
+        self._profile = encoding_profile
+        self._quality = quality
+        # CPU time in milliseconds rendering an image may take, 0 for no limit
+        self._cpu_budget = cpu_budget
+        # CPU time the last image rendered with each profile took
+        self._render_times = {}
+        # side of the square around the location to crop the radar image to
+        self._crop_size = crop_size
+        # run image processing in a worker process instead of a thread, so it
+        # does not hold the GIL
+        self._process_pool = process_pool
+        # assemble the animation from individually fetched frames
+        self._incremental_frames = incremental_frames
 
         # Condition that guards the loading indicator.
         #
@@ -106,28 +503,89 @@ class DhmzRadar(Camera):
         self._condition = asyncio.Condition()
 
         self._last_image: Optional[bytes] = None
-        self._last_resized_image: Optional[bytes] = None
-        # value of the last seen last modified header
-        self._last_modified: Optional[str] = None
+        # incremented whenever _last_image changes
+        self._image_version = 0
+        # resized encodings of _last_image, least recently used first, keyed
+        # by (width, height, content type, image version)
+        self._resized = OrderedDict()
+        self._resized_bytes = 0
+        self._resize_cache_size = resize_cache_size
+        # resize jobs in flight, by the same key
+        self._resizing = SingleFlight()
+        # JPEG frames of _last_image for MJPEG streams, with the image version
+        # they were encoded from, shared by all streams
+        self._jpeg_frames = (None, None)
+        # JPEG encodings in flight, by image version
+        self._encoding = SingleFlight()
+        # digest of the source GIF or frames _last_image was rendered from
+        self._source_digest: Optional[str] = None
         # loading status
         self._loading = False
+        # background refresh started for a stale image
+        self._refresh_task = None
         # deadline for image refresh - self.delta after last successful load
         self._deadline: Optional[datetime] = None
-        # Initialize storage for images
-        self._images_content = [ None for i in range(25) ]
-        self._images = [ {
-                "content_length": 0,
-                "etag": "",
-                "last_modified": None
-            } for i in range(25) ]
-        self._last_gif_modified = None
-        self._last_gif_etag = None
+        # image version last written to the cache file
+        self._cached_version = 0
+
+    @property
+    def _cache_path(self) -> str:
+        return self.hass.config.path(CACHE_FILE.format(slugify(self._name)))
+
+    @property
+    def _cache_key(self) -> dict:
+        """Return the settings the cached image was produced with."""
+        return {
+            "version": CACHE_VERSION,
+            "show_location": self._show_location,
+            "longitude": self._longitude,
+            "latitude": self._latitude,
+            "encoding_profile": self._encoding_profile,
+            "quality": self._quality,
+            "crop_size": self._crop_size,
+        }
+
+    async def async_added_to_hass(self) -> None:
+        """Restore the last radar image, so it can be served right after a restart."""
+        await super().async_added_to_hass()
+        await get_radar_source(self.hass).async_load()
+        cache = await self.hass.async_add_executor_job(read_cache, self._cache_path)
+        if cache is None or self._last_image is not None:
+            return
+        header, image = cache
+        if header.get("key") != self._cache_key or not image:
+            return
+        self._set_image(image)
+        self._cached_version = self._image_version
+        self._source_digest = header.get("source")
+        self._deadline = dt_util.parse_datetime(header.get("deadline") or "")
+        _LOG.debug("Restored DHMZ radar image from %s", self._cache_path)
+
+    def _async_save_cache(self) -> None:
+        """Write the current image to the cache file."""
+        if self._cached_version == self._image_version or not self._last_image:
+            return
+        self._cached_version = self._image_version
+        header = {
+            "key": self._cache_key,
+            "source": self._source_digest,
+            "deadline": self._deadline.isoformat() if self._deadline else None,
+        }
+        self.hass.async_add_executor_job(write_cache, self._cache_path, header, self._last_image)
 
     @property
     def name(self) -> str:
         """Return the component name."""
         return self._name
 
+    @property
+    def extra_state_attributes(self):
+        """Return the encoding profile in use and the CPU time each profile took."""
+        attributes = {"encoding_profile": self._profile}
+        for profile, render_time in self._render_times.items():
+            attributes["render_time_" + profile] = round(render_time, 1)
+        return attributes
+
     @property
     def entity_picture(self):
         """Return a link to the camera feed as entity picture."""
@@ -150,155 +608,184 @@ class DhmzRadar(Camera):
         """Set the content type of the image (no-op)."""
         pass
 
-    def __needs_refresh(self) -> bool:
-        if not (self._delta and self._deadline and self._last_image):
-            return True
-
-        return dt_util.utcnow() > self._deadline
+    async def _async_run(self, target, *args):
+        """Run an image processing job off the event loop."""
+        if self._process_pool:
+            return await self.hass.loop.run_in_executor(get_process_pool(self.hass), target, *args)
+        return await self.hass.async_add_executor_job(target, *args)
 
-    async def __retrieve_radar_image_old(self, width, height) -> bool:
-        """Retrieve old radar image format (GIF) and return whether this succeeded."""
-        session = async_get_clientsession(self.hass)
+    def _set_image(self, image: bytes) -> None:
+        self._last_image = image
+        self._image_version += 1
+        self._resized.clear()
+        self._resized_bytes = 0
+        self._jpeg_frames = (None, None)
 
-        if self._images[0]["last_modified"]:
-            headers = {"If-Modified-Since": self._images[0]["last_modified"] }
-        else:
-            headers = {}
+    async def _async_render(self, digest: str, fallback: Optional[bytes], target, *args) -> bool:
+        """Render the image from the source content identified by digest.
 
-        _LOG.debug("GET url: %s", RADAR_MAP_URL_ANIM_GIF )
-        try:
-            res = await session.get( RADAR_MAP_URL_ANIM_GIF , timeout=5, headers=headers)
-            res.raise_for_status()
-        except (asyncio.TimeoutError, aiohttp.ClientError) as err:
-            _LOG.error("Failed to fetch get, %s", err)
-            return False
-
-        if res.status == 304:
-            _LOG.debug("GET - HTTP 304 - success")
+        Returns whether _last_image is current. If rendering fails, fallback
+        is served instead, when given.
+        """
+        if digest == self._source_digest and self._last_image:
             return True
-
+        profile = self._profile
+        # Decoding, drawing and encoding all frames takes hundreds of
+        # milliseconds, and must not block the event loop
         try:
-            current_content = await res.read()
-        except (asyncio.TimeoutError, aiohttp.ClientError) as err:
-            _LOG.error("Failed to read content, %s", err)
-            return False
-
-        self._last_image = BytesIO(current_content).getvalue()
-
-        last_modified = res.headers.get("last-modified")
-        if last_modified:
-            self._images[0]["last_modified"] = last_modified
+            image, render_time, stages = await self._async_run(
+                timed, target, *args, self._show_location, self._longitude, self._latitude,
+                profile, self._crop_size, self._quality
+            )
+            _LOG.debug("Processed and saved DHMZ radar animation, profile: %s, %.0f ms", profile, render_time)
+            self._render_times[profile] = render_time
+            metrics = get_metrics(self.hass)
+            metrics.record("radar/render_ms", render_time)
+            for stage, stage_time in stages.items():
+                metrics.record("radar/" + stage + "_ms", stage_time)
+            metrics.record("radar/output_bytes", len(image))
+            if self._cpu_budget and render_time > self._cpu_budget and profile in FALLBACK_PROFILES:
+                self._profile = FALLBACK_PROFILES[profile]
+                _LOG.warning(
+                    "Rendering DHMZ radar image with profile %s took %.0f ms, over the budget of %.0f ms, using profile %s from now on",
+                    profile, render_time, self._cpu_budget, self._profile
+                )
+        except Exception as err:
+            _LOG.error("Failed to process DHMZ radar image: %s", err)
+            if fallback is None:
+                return False
+            image = fallback
+        self._source_digest = digest
+        self._set_image(image)
+        return True
 
-        _LOG.debug("Got image %s", RADAR_MAP_URL_ANIM_GIF )
+    async def _async_resized_image(self, width: int, height: int) -> Optional[bytes]:
+        """Return _last_image scaled down to fit width and height.
 
-        return True
+        Each size is resized once per image version, concurrent requests for
+        the same size share one resize job.
+        """
+        image = self._last_image
+        if not image or not (width or height):
+            return image
 
-    async def __retrieve_radar_image(self, width, height) -> bool:
-        """Retrieve animated GIF and return whether this succeeded."""
-        session = async_get_clientsession(self.hass)
+        key = (width, height, self.content_type, self._image_version)
+        resized = self._resized.get(key)
+        if resized is not None:
+            self._resized.move_to_end(key)
+            return resized
 
-        headers = {}
-        if self._last_gif_modified:
-            headers["If-Modified-Since"] = self._last_gif_modified
-        if self._last_gif_etag:
-            headers["If-None-Match"] = self._last_gif_etag
+        return await self._resizing.async_run(self.hass, key, self._async_resize, key, image, width, height)
 
-        _LOG.debug("GET url: %s", RADAR_MAP_URL_ANIM_GIF)
+    async def _async_resize(self, key, image: bytes, width: int, height: int) -> bytes:
         try:
-            res = await session.get(RADAR_MAP_URL_ANIM_GIF, timeout=10, headers=headers)
-            res.raise_for_status()
-        except (asyncio.TimeoutError, aiohttp.ClientError) as err:
-            _LOG.error("Failed to fetch DHMZ radar GIF: %s", err)
-            return False
+            resized = await self._async_run(resize_radar, image, width, height)
+        except Exception as err:
+            _LOG.error("Failed to resize DHMZ radar image: %s", err)
+            return image
+
+        if len(resized) >= len(image):
+            resized = image
+        if key[-1] == self._image_version:
+            self._cache_resized(key, resized)
+        return resized
+
+    def _cache_resized(self, key, resized: bytes) -> None:
+        # images that were not resized cost nothing to keep
+        size = 0 if resized is self._last_image else len(resized)
+        if size > self._resize_cache_size:
+            return
+        self._resized[key] = resized
+        self._resized_bytes += size
+        while self._resized_bytes > self._resize_cache_size:
+            _, evicted = self._resized.popitem(last=False)
+            if evicted is not self._last_image:
+                self._resized_bytes -= len(evicted)
+
+    async def _async_jpeg_frames(self):
+        """Return the frames of _last_image as JPEG images, encoding them once per image version."""
+        image = self._last_image
+        version = self._image_version
+        if not image:
+            return None
+        if self._jpeg_frames[0] == version:
+            return self._jpeg_frames[1]
+        return await self._encoding.async_run(self.hass, version, self._async_encode_jpeg_frames, image, version)
+
+    async def _async_encode_jpeg_frames(self, image: bytes, version: int):
+        try:
+            frames = await self._async_run(jpeg_frames, image)
+        except Exception as err:
+            _LOG.error("Failed to encode DHMZ radar frames for streaming: %s", err)
+            frames = None
+        if version == self._image_version:
+            self._jpeg_frames = (version, frames)
+        return frames
+
+    async def _async_stream_frames(self):
+        """Yield JPEG frames of the radar animation at their native timing, forever."""
+        while True:
+            # refreshes the radar image once it is due
+            await self.async_camera_image()
+            frames = await self._async_jpeg_frames()
+            if not frames:
+                # ends the stream
+                yield None
+                return
+            for frame, duration in frames:
+                yield frame
+                await asyncio.sleep(max(duration, MIN_STREAM_FRAME_TIME) / 1000)
+
+    async def handle_async_mjpeg_stream(self, request):
+        """Serve the radar animation as an MJPEG stream.
+
+        Frames are encoded once per radar image and shared by all streams,
+        so every connected client only costs socket writes.
+        """
+        frames = self._async_stream_frames()
+        try:
+            return await async_get_still_stream(request, frames.__anext__, "image/jpeg", 0)
+        finally:
+            await frames.aclose()
 
-        if res.status == 304:
-            _LOG.debug("DHMZ radar GIF - HTTP 304 (not modified)")
+    def __needs_refresh(self) -> bool:
+        if not (self._delta and self._deadline and self._last_image):
             return True
 
-        try:
-            current_content = await res.read()
-        except (asyncio.TimeoutError, aiohttp.ClientError) as err:
-            _LOG.error("Failed to read DHMZ radar GIF content: %s", err)
+        return dt_util.utcnow() > self._deadline
+
+    def __can_serve_stale(self) -> bool:
+        if not (self._max_staleness and self._deadline and self._last_image):
             return False
 
-        # Update cache headers
-        self._last_gif_modified = res.headers.get("last-modified")
-        self._last_gif_etag = res.headers.get("etag")
-
-        if not self._show_location:
-            if self._image_format and self._image_format.upper() == "WEBP":
-                # Convert GIF to WebP animation
-                try:
-                    im = Image.open(BytesIO(current_content))
-                    frames = []
-                    durations = []
-                    for frame in ImageSequence.Iterator(im):
-                        frames.append(frame.copy().convert("RGBA"))
-                        durations.append(frame.info.get('duration', 100))
-                    
-                    file_bytes_io = BytesIO()
-                    frames[0].save(
-                        file_bytes_io,
-                        format="WEBP",
-                        save_all=True,
-                        append_images=frames[1:],
-                        optimize=True,
-                        duration=durations,
-                        loop=0
-                    )
-                    self._last_image = file_bytes_io.getvalue()
-                    _LOG.debug("Converted DHMZ radar GIF to WebP animation")
-                    return True
-                except Exception as err:
-                    _LOG.error("Failed to convert GIF to WebP: %s", err)
-                    self._last_image = current_content
-                    return True
-            else:
-                self._last_image = current_content
-                return True
-
-        # Process frames to draw location marker
-        try:
-            im = Image.open(BytesIO(current_content))
-            frames = []
-            durations = []
-            
-            for frame in ImageSequence.Iterator(im):
-                frame_copied = frame.copy().convert("RGBA")
-                draw = ImageDraw.Draw(frame_copied)
-                
-                x_coord = int((0.11346541830650277 * self._longitude - 1.3351816168381) * float(im.size[0]))
-                y_coord = int((-0.15304197356993342 * self._latitude + 7.31403749212996) * float(im.size[1]))
-                
-                # Draw marker
-                draw.ellipse((x_coord-4, y_coord-4, x_coord+4, y_coord+4), fill=(255, 0, 0), outline=(0, 0, 0))
-                
-                frames.append(frame_copied)
-                durations.append(frame.info.get('duration', 100))
-                
-            file_bytes_io = BytesIO()
-            fmt = self._image_format if self._image_format else "GIF"
-            frames[0].save(
-                file_bytes_io,
-                format=fmt,
-                save_all=True,
-                append_images=frames[1:],
-                optimize=True,
-                duration=durations,
-                loop=0
-            )
-            self._last_image = file_bytes_io.getvalue()
-            _LOG.debug("Processed and saved DHMZ radar animation, format: %s", fmt)
-            return True
-        except Exception as err:
-            _LOG.error("Error drawing location on DHMZ radar GIF: %s", err)
-            self._last_image = current_content
-            return True
+        return dt_util.utcnow() <= self._deadline + timedelta(seconds=self._max_staleness)
 
     async def async_camera_image(self, width: int = 0, height: int = 0) -> Optional[bytes]:
         """
         Return a still image response from the camera.
 
+        Once the image is due for a refresh, callers wait for it, unless the
+        image is within max_staleness past its deadline. Then the cached
+        image is returned right away and refreshed in the background.
+        """
+        if not self.__needs_refresh():
+            _LOG.debug("Last image returned, did not need refresh, width: %s, height: %s", width, height)
+            return await self._async_resized_image(width, height)
+
+        if self.__can_serve_stale():
+            if self._refresh_task is None or self._refresh_task.done():
+                self._refresh_task = self.hass.async_create_task(self._async_refresh(width, height))
+            _LOG.debug("Stale image returned, refreshing in background, width: %s, height: %s", width, height)
+            return await self._async_resized_image(width, height)
+
+        await self._async_refresh(width, height)
+        _LOG.debug("Last image returned, after refresh, width: %s, height: %s", width, height)
+        return await self._async_resized_image(width, height)
+
+    async def _async_refresh(self, width: int, height: int) -> None:
+        """
+        Refresh the radar image, or wait for the refresh in progress.
+
         Uses ayncio conditions to make sure only one task enters the critical
         section at the same time. Otherwise, two http requests would start
         when two tabs with home assistant are open.
@@ -314,32 +801,34 @@ class DhmzRadar(Camera):
             again before continuing.
           * :func:`asyncio.Condition.notify_all` requires the lock to be held.
         """
-        if not self.__needs_refresh():
-            _LOG.debug("Last image returned, did not need refresh, width: %s, height: %s", width, height)
-            return self._last_image
-
         # get lock, check iff loading, await notification if loading
         async with self._condition:
             # can not be tested - mocked http response returns immediately
             if self._loading:
                 _LOG.debug("already loading - waiting for notification")
                 await self._condition.wait()
-                return self._last_image
+                return
 
             # Set loading status **while holding lock**, makes other tasks wait
             self._loading = True
 
         try:
             now = dt_util.utcnow()
-            was_updated = await self.__retrieve_radar_image(width, height)
-            if was_updated == False:
-                was_updated = await self.__retrieve_radar_image_old(width, height)
+            source = get_radar_source(self.hass)
+            was_updated = False
+            if self._incremental_frames and await source.async_fetch_frames():
+                durations = [self._previous_images_time] * (RADAR_MAP_FRAMES - 1) + [self._current_image_time]
+                was_updated = await self._async_render(
+                    source.frames_digest, None, render_frames, list(source.frames), durations
+                )
+            if was_updated == False and await source.async_fetch_gif():
+                was_updated = await self._async_render(
+                    source.gif_digest, source.gif, render_radar, source.gif
+                )
             # was updated? Set new deadline relative to now before loading
             if was_updated:
                 self._deadline = now + timedelta(seconds=self._delta)
-
-            _LOG.debug("Last image returned, after refresh, width: %s, height: %s", width, height)
-            return self._last_image
+                self._async_save_cache()
         finally:
             # get lock, unset loading status, notify all waiting tasks
             async with self._condition:
@@ -0,0 +1,355 @@
+"""Shared cache of the DHMZ XML feeds."""
+import asyncio
+from collections import deque
+from datetime import timedelta
+import hashlib
+from io import BytesIO
+import logging
+import re
+
+import aiohttp
+from lxml import etree
+
+from homeassistant.helpers.aiohttp_client import async_get_clientsession
+from homeassistant.util import dt as dt_util
+
+from . import DOMAIN
+from .metrics import get_metrics
+
+_LOGGER = logging.getLogger(__name__)
+
+DATA_FEEDS = "feeds"
+
+# Polling interval of feeds without a schedule of their own
+FEED_TTL = timedelta(minutes=10)
+
+# Time zone of the timestamps in the DHMZ feeds
+DHMZ_TIME_ZONE = dt_util.get_time_zone("Europe/Zagreb")
+
+# Number of recent publication delays a schedule learns from
+LAG_SAMPLES = 8
+
+# Deadline for a single feed request, and for a whole refresh of all feeds
+FEED_REQUEST_TIMEOUT = 20
+FEED_UPDATE_TIMEOUT = 45
+
+# First element name in a document, skipping the XML declaration, comments
+# and the doctype, which all start with "<?" or "<!"
+ROOT_TAG = re.compile(rb"<([A-Za-z_][\w.:-]*)")
+
+
+class IncompleteFeedError(Exception):
+    """Raised when a feed body was cut off before the end of the document."""
+
+
+def feed_name(url):
+    """Return the file name of the feed at url, which names its metrics."""
+    return url.rsplit("/", 1)[-1]
+
+
+def feed_digest(body):
+    """Return the fingerprint used to recognise an unchanged feed body."""
+    return hashlib.blake2b(body, digest_size=16).digest()
+
+
+def is_complete(body):
+    """Return True if body ends by closing the element it started with.
+
+    DHMZ intermittently serves truncated documents with a 200; this cheap
+    check catches them before they are hashed or handed to the parser.
+    Comments and processing instructions after the root element are
+    allowed, as in any XML document.
+    """
+    match = ROOT_TAG.search(body)
+    if match is None:
+        return False
+    tail = body.rstrip(b" \t\r\n\x00")
+    while tail.endswith((b"-->", b"?>")):
+        start = tail.rfind(b"<!--" if tail.endswith(b"-->") else b"<?")
+        if start < match.end():
+            return False
+        tail = tail[:start].rstrip(b" \t\r\n\x00")
+    if tail.endswith(b"/>") and body.find(b">", match.end()) == len(tail) - 1:
+        return True
+    return re.search(rb"</" + re.escape(match.group(1)) + rb"\s*>$", tail[-256:]) is not None
+
+
+class FeedSchedule:
+    """When to poll one feed, learned from the timestamps in its data.
+
+    A feed is expected to carry new data every period. The delay between
+    the timestamp in the data and the first poll that saw it is recorded,
+    and the shortest recent delay is taken as the feed's publication lag:
+    the next poll is due one period after the latest data, plus that lag.
+    Until new data shows up, the feed is retried, starting at retry and
+    backing off up to max_interval, which also bounds the time between
+    any two polls.
+
+    For feeds whose data has no timestamp, published is None and the time
+    a change was first seen stands in for it.
+    """
+
+    def __init__(self, period, retry, max_interval=None, published=None):
+        """Initialize the schedule, due right away."""
+        self.period = period
+        self.retry = retry
+        self.max_interval = max_interval or period
+        self.published = published
+        # timestamp of the newest data, and when it was first seen
+        self.latest = None
+        self.lags = deque(maxlen=LAG_SAMPLES)
+        self.next_poll = None
+        self._retries = 0
+
+    @property
+    def lag(self):
+        """Return the learned delay between the data timestamp and its publication."""
+        return min(self.lags) if self.lags else timedelta(0)
+
+    def due(self, now):
+        """Return True when the feed should be polled."""
+        return self.next_poll is None or now >= self.next_poll
+
+    def _timestamp(self, result, changed, now):
+        if self.published is not None and result is not None:
+            published = self.published(result)
+            if published is not None:
+                return published.replace(tzinfo=DHMZ_TIME_ZONE)
+            return None
+        return now if changed or self.latest is None else None
+
+    def polled(self, result, changed, now):
+        """Schedule the next poll after a successful one."""
+        published = self._timestamp(result, changed, now)
+        if published is not None and (self.latest is None or published > self.latest):
+            if self.latest is not None:
+                # Only data that appeared between two polls tells the lag
+                self.lags.append(max(now - published, timedelta(0)))
+            self.latest = published
+            self._retries = 0
+        else:
+            self._retries += 1
+
+        expected = None
+        if self.latest is not None:
+            expected = self.latest + self.period + self.lag
+        if expected is None or expected <= now:
+            # Overdue, or not known yet
+            expected = now + min(self.retry * 2 ** max(self._retries - 1, 0), self.max_interval)
+        self.next_poll = min(expected, now + self.max_interval)
+
+    def failed(self, now):
+        """Schedule a retry after a failed poll."""
+        self._retries += 1
+        self.next_poll = now + min(self.retry * 2 ** (self._retries - 1), self.max_interval)
+
+
+class DhmzFeed:
+    """A single feed document, its validators and the results parsed from it."""
+
+    def __init__(self, url):
+        """Initialize an empty feed."""
+        self.url = url
+        self.name = feed_name(url)
+        self.body = None
+        self.digest = None
+        self.etag = None
+        self.last_modified = None
+        self.results = {}
+        self.schedule = FeedSchedule(FEED_TTL, FEED_TTL)
+        self.lock = asyncio.Lock()
+
+    def discard(self):
+        """Forget the body and validators, so that the next get downloads it fully."""
+        # Never keep serving a body that does not parse, and never let a
+        # 304 revalidate it either.
+        self.body = None
+        self.digest = None
+        self.etag = None
+        self.last_modified = None
+        self.results = {}
+
+
+class DhmzFeedCache:
+    """Process-wide cache of DHMZ feeds, keyed by URL.
+
+    Every feed is downloaded only when its FeedSchedule is due, and every
+    parser runs at most once per downloaded body, no matter how many DhmzData instances
+    read from it. Downloads go through the shared Home Assistant session,
+    so connections to the DHMZ hosts are pooled and kept alive, and are
+    conditional on the last ETag / Last-Modified, so an unchanged feed is
+    revalidated with a 304 and its previous parse is reused as-is. Bodies
+    that come back with a 200 are fingerprinted, and one identical to the
+    previous body is treated the same way as a 304. Unchanged feeds keep
+    returning the very same result objects, so callers can tell that
+    nothing changed with an identity check.
+
+    Fetch time, bytes received, the 304 and cache hit ratios and parse time
+    of every feed are recorded in the DhmzMetrics, grouped by feed name.
+    """
+
+    def __init__(self, hass):
+        """Initialize the cache."""
+        self._hass = hass
+        self._feeds = {}
+        self._metrics = get_metrics(hass)
+
+    def _feed(self, url):
+        feed = self._feeds.get(url)
+        if feed is None:
+            feed = self._feeds[url] = DhmzFeed(url)
+        return feed
+
+    def set_schedule(self, url, schedule):
+        """Poll the feed at url according to schedule instead of every FEED_TTL."""
+        self._feed(url).schedule = schedule
+
+    def next_poll(self):
+        """Return when the first feed is due, or None if one is due already."""
+        polls = [feed.schedule.next_poll for feed in self._feeds.values()]
+        if not polls or None in polls:
+            return None
+        return min(polls)
+
+    def diagnostics(self):
+        """Return the state of every feed and its schedule, by feed name."""
+        return {
+            feed.name: {
+                "url": feed.url,
+                "cached": feed.body is not None,
+                "bytes": len(feed.body) if feed.body is not None else 0,
+                "latest": feed.schedule.latest.isoformat() if feed.schedule.latest else None,
+                "lag": feed.schedule.lag.total_seconds(),
+                "next_poll": feed.schedule.next_poll.isoformat() if feed.schedule.next_poll else None,
+            }
+            for feed in self._feeds.values()
+        }
+
+    async def _async_fetch(self, feed):
+        """Download the feed body, or return False if it was not modified.
+
+        Raises IncompleteFeedError, and keeps the previous body, when the
+        response was cut off.
+        """
+        session = async_get_clientsession(self._hass)
+
+        headers = {}
+        if feed.body is not None:
+            if feed.last_modified:
+                headers["If-Modified-Since"] = feed.last_modified
+            if feed.etag:
+                headers["If-None-Match"] = feed.etag
+
+        res = await session.get(feed.url, timeout=aiohttp.ClientTimeout(total=FEED_REQUEST_TIMEOUT), headers=headers)
+        res.raise_for_status()
+        if res.status == 304:
+            return False
+
+        body = await res.read()
+        self._metrics.record(feed.name + "/bytes", len(body))
+        if (
+            res.content_length is not None
+            and "content-encoding" not in res.headers
+            and len(body) < res.content_length
+        ) or not is_complete(body):
+            raise IncompleteFeedError(f"{len(body)} bytes received")
+
+        feed.etag = res.headers.get("etag")
+        feed.last_modified = res.headers.get("last-modified")
+        digest = feed_digest(body)
+        if feed.body is not None and digest == feed.digest:
+            _LOGGER.debug("Feed body unchanged: %s", feed.url)
+            return False
+
+        feed.body = body
+        feed.digest = digest
+        return True
+
+    async def async_get(self, url, parser=etree.parse, *args):
+        """Return the feed at url parsed by parser(body, *args), or None if that failed.
+
+        Results are cached per parser and arguments, so args must be hashable.
+        """
+        key = (parser, args)
+        feed = self._feed(url)
+        async with feed.lock:
+            now = dt_util.utcnow()
+            try:
+                polled = feed.schedule.due(now)
+                changed = False
+                if polled:
+                    with self._metrics.timer(feed.name + "/fetch_ms"):
+                        changed = await self._async_fetch(feed)
+                    self._metrics.record(feed.name + "/not_modified_ratio", not changed)
+                    if changed:
+                        _LOGGER.debug("Feed cache miss: %s", url)
+                        feed.results = {}
+                    else:
+                        # Keep the previous parse, nothing was transferred
+                        _LOGGER.debug("Feed not modified: %s", url)
+                elif feed.body is None:
+                    # Failed before, waiting for the retry
+                    return None
+                else:
+                    _LOGGER.debug("Feed cache hit: %s", url)
+
+                self._metrics.record(feed.name + "/cache_hit_ratio", key in feed.results)
+                if key not in feed.results:
+                    with self._metrics.timer(feed.name + "/parse_ms"):
+                        feed.results[key] = await self._hass.async_add_executor_job(
+                            parser, BytesIO(feed.body), *args
+                        )
+                if polled:
+                    feed.schedule.polled(feed.results[key], changed, now)
+                    _LOGGER.debug("Next poll of %s at %s", url, feed.schedule.next_poll)
+                return feed.results[key]
+
+            except asyncio.TimeoutError:
+                _LOGGER.error("Timeout fetching %s", url)
+            except aiohttp.ClientResponseError as err:
+                _LOGGER.error("HTTP error: %s %s", err.status, err.message)
+            except aiohttp.ClientError as err:
+                _LOGGER.error("URL error: %s", err)
+            except IncompleteFeedError as err:
+                _LOGGER.error("Truncated feed %s: %s", url, err)
+            except etree.XMLSyntaxError as err:
+                _LOGGER.error("LXML XML SYNTAX error: %s as position: %s, offset: %s, line: %s", err.msg, err.position, err.offset, err.lineno )
+                feed.discard()
+            except etree.ParserError as err:
+                _LOGGER.error("LXML PARSER error: %s", err )
+                feed.discard()
+            except (ValueError, TypeError, KeyError, IndexError) as err:
+                # Well-formed, but with content the parser does not expect,
+                # e.g. a malformed date or number. Fail this feed only.
+                _LOGGER.error("Unexpected content in %s: %r", url, err)
+                feed.discard()
+            feed.schedule.failed(now)
+            return None
+
+    async def async_get_many(self, parsers):
+        """Fetch and parse several feeds concurrently.
+
+        Takes a {url: (parser, *args)} dict and returns a {url: result} dict. Feeds
+        that failed, or did not finish within FEED_UPDATE_TIMEOUT, map to
+        None so that the caller can keep its previous data for them.
+        """
+        tasks = {url: asyncio.ensure_future(self.async_get(url, *parser)) for url, parser in parsers.items()}
+        _, pending = await asyncio.wait(tasks.values(), timeout=FEED_UPDATE_TIMEOUT)
+        for task in pending:
+            task.cancel()
+        ret = {}
+        for url, task in tasks.items():
+            if task in pending:
+                _LOGGER.error("Timeout refreshing %s", url)
+                ret[url] = None
+            else:
+                ret[url] = task.result()
+        return ret
+
+
+def get_feed_cache(hass):
+    """Return the feed cache shared by all DHMZ platforms."""
+    domain_data = hass.data.setdefault(DOMAIN, {})
+    if DATA_FEEDS not in domain_data:
+        domain_data[DATA_FEEDS] = DhmzFeedCache(hass)
+    return domain_data[DATA_FEEDS]
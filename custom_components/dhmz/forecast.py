@@ -0,0 +1,224 @@
+"""Columnar store for the DHMZ hourly forecast."""
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timedelta
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional, the array module covers everything
+    np = None
+
+# Forecast times are naive local time, as published by DHMZ. They are kept
+# as whole seconds since this epoch, without any time zone conversion, so a
+# day is always exactly 86400 seconds of the column.
+EPOCH = datetime(1970, 1, 1)
+DAY = 86400
+
+# Stored for a numeric value that is missing from the feed
+MISSING = float("nan")
+
+
+def to_seconds(moment):
+    """Return a naive datetime as seconds since EPOCH."""
+    return (moment - EPOCH) // timedelta(seconds=1)
+
+
+def from_seconds(seconds):
+    """Return seconds since EPOCH as a naive datetime."""
+    return EPOCH + timedelta(seconds=seconds)
+
+
+def _float_value(value):
+    if value is None or not value.strip():
+        return MISSING
+    return float(value)
+
+
+def _float_column(values):
+    if np is not None:
+        column = np.array(values, dtype=object)
+        column[column == None] = ""  # noqa: E711, compared element-wise
+        column = np.char.strip(column.astype(str))
+        return array("d", np.where(column == "", "nan", column).astype(np.float64).tobytes())
+    return array("d", map(_float_value, values))
+
+
+def _day_seconds(date):
+    return to_seconds(datetime.strptime(date, "%d.%m.%Y."))
+
+
+def _time_column(dates, hours):
+    if np is not None:
+        unique, inverse = np.unique(np.array(dates, dtype=str), return_inverse=True)
+        days = np.array([_day_seconds(date) for date in unique.tolist()], dtype=np.int64)
+        times = days[inverse.reshape(-1)] + np.array(hours, dtype=str).astype(np.int64) * 3600
+        return array("q", times.tobytes())
+    days = {}
+    times = array("q")
+    for date, hour in zip(dates, hours):
+        day = days.get(date)
+        if day is None:
+            day = days[date] = _day_seconds(date)
+        times.append(day + int(hour) * 3600)
+    return times
+
+
+def _wind_speed_column(wind):
+    if np is not None and wind:
+        values = np.array(wind, dtype=str)
+        lengths = np.char.str_len(values)
+        # the last character of every value, as its code point
+        last = values.view(np.uint32).reshape(len(values), -1)[np.arange(len(values)), lengths - 1]
+        speed = last.astype(np.int64) - ord("0")
+        if ((lengths == 0) | (speed < 0) | (speed > 9)).any():
+            raise ValueError("Invalid wind value in %s" % wind)
+        return array("b", speed.astype(np.int8).tobytes())
+    return array("b", [int(value[-1:]) for value in wind])
+
+
+class HourlyForecast:
+    """The 7 day hourly forecast of one station, stored column by column.
+
+    Numeric values are converted once, when the feed is parsed, into typed
+    arrays sorted by time: times (seconds since EPOCH), temperature,
+    precipitation and the wind speed code. A temperature or precipitation
+    that is missing or empty in the feed is stored as NaN. Wind bearings
+    and weather symbols ("2", "2n", ...) are categorical and stay as tuples
+    of strings. The conversion and the per day aggregates use NumPy when it
+    is available, and give the same results without it.
+
+    The store is immutable, the typed columns are exposed as read-only
+    memoryviews. One store is shared by the feed cache and every snapshot
+    of the station.
+    """
+
+    __slots__ = ("times", "temperature", "precipitation", "wind_speed", "wind_bearing", "symbol", "_datetimes")
+
+    def __init__(self, times, temperature, precipitation, wind_speed, wind_bearing, symbol):
+        """Initialize the store from columns already sorted by time."""
+        object.__setattr__(self, "times", memoryview(times).toreadonly())
+        object.__setattr__(self, "temperature", memoryview(temperature).toreadonly())
+        object.__setattr__(self, "precipitation", memoryview(precipitation).toreadonly())
+        object.__setattr__(self, "wind_speed", memoryview(wind_speed).toreadonly())
+        object.__setattr__(self, "wind_bearing", tuple(wind_bearing))
+        object.__setattr__(self, "symbol", tuple(symbol))
+        object.__setattr__(self, "_datetimes", None)
+
+    def __setattr__(self, name, value):
+        """Refuse to modify the store."""
+        raise AttributeError("HourlyForecast is immutable")
+
+    __delattr__ = __setattr__
+
+    @classmethod
+    def from_strings(cls, dates, hours, temperature, precipitation, wind, symbol):
+        """Build the store from the raw string values of 7d_graf_i_simboli.xml.
+
+        dates are "d.m.Y." strings, hours are hours of the day and wind
+        values are a bearing followed by a single digit speed code ("NE2").
+        """
+        times = _time_column(dates, hours)
+        columns = (
+            times,
+            _float_column(temperature),
+            _float_column(precipitation),
+            _wind_speed_column(wind),
+            tuple(value[:-1] for value in wind),
+            tuple(symbol),
+        )
+        if times.tolist() != sorted(times):
+            order = sorted(range(len(times)), key=times.__getitem__)
+            columns = tuple(
+                type(column)(column.typecode, (column[i] for i in order))
+                if isinstance(column, array) else tuple(column[i] for i in order)
+                for column in columns
+            )
+        return cls(*columns)
+
+    def __len__(self):
+        """Return the number of forecast slots."""
+        return len(self.times)
+
+    @property
+    def datetimes(self):
+        """Return the forecast times as a tuple of naive datetimes."""
+        if self._datetimes is None:
+            object.__setattr__(self, "_datetimes", tuple(from_seconds(seconds) for seconds in self.times))
+        return self._datetimes
+
+    def index_after(self, moment):
+        """Return the index of the first slot later than moment."""
+        return bisect_right(self.times, to_seconds(moment))
+
+    def slice(self, start, stop=None):
+        """Return the slots from start to stop as a new store."""
+        ret = HourlyForecast(
+            self.times[start:stop],
+            self.temperature[start:stop],
+            self.precipitation[start:stop],
+            self.wind_speed[start:stop],
+            self.wind_bearing[start:stop],
+            self.symbol[start:stop],
+        )
+        if self._datetimes is not None:
+            object.__setattr__(ret, "_datetimes", self._datetimes[start:stop])
+        return ret
+
+    def window(self, start, end):
+        """Return the slots later than start and up to end."""
+        return self.slice(
+            bisect_right(self.times, to_seconds(start)),
+            bisect_right(self.times, to_seconds(end)),
+        )
+
+    def next_hours(self, moment, hours=24):
+        """Return the slots in the given number of hours after moment."""
+        return self.window(moment, moment + timedelta(hours=hours))
+
+    def _day_bounds(self):
+        """Return the start index of every day, and the day numbers."""
+        if not self.times:
+            return [], []
+        if np is not None:
+            days = np.frombuffer(self.times, dtype=np.int64) // DAY
+            starts = np.concatenate(([0], np.flatnonzero(np.diff(days)) + 1))
+            return starts.tolist(), days[starts].tolist()
+        starts = []
+        start = 0
+        while start < len(self.times):
+            starts.append(start)
+            start = bisect_left(self.times, (self.times[start] // DAY + 1) * DAY, start)
+        return starts, [self.times[start] // DAY for start in starts]
+
+    def _per_day(self, column, ufunc, neutral, reducer):
+        """Return {date: value} of column reduced per day.
+
+        Missing values are left out, a day without any value maps to NaN.
+        """
+        starts, days = self._day_bounds()
+        dates = [from_seconds(day * DAY).date() for day in days]
+        if np is not None and starts:
+            values = np.frombuffer(column, dtype=np.float64)
+            missing = np.isnan(values)
+            reduced = ufunc.reduceat(np.where(missing, neutral, values), starts)
+            present = np.add.reduceat(~missing, starts)
+            values = np.where(present, reduced, MISSING).tolist()
+        else:
+            bounds = starts[1:] + [len(column)]
+            values = []
+            for start, stop in zip(starts, bounds):
+                present = [value for value in column[start:stop] if value == value]
+                values.append(reducer(present) if present else MISSING)
+        return dict(zip(dates, values))
+
+    def daily_max_temperature(self):
+        """Return {date: highest temperature}."""
+        return self._per_day(self.temperature, getattr(np, "maximum", None), float("-inf"), max)
+
+    def daily_min_temperature(self):
+        """Return {date: lowest temperature}."""
+        return self._per_day(self.temperature, getattr(np, "minimum", None), float("inf"), min)
+
+    def daily_precipitation(self):
+        """Return {date: total precipitation}."""
+        return self._per_day(self.precipitation, getattr(np, "add", None), 0.0, sum)
@@ -0,0 +1,118 @@
+"""Rolling performance metrics of the DHMZ feeds and radar."""
+from collections import deque
+from contextlib import contextmanager
+import time
+
+from . import DOMAIN
+
+DATA_METRICS = "metrics"
+
+# Number of recent samples each metric keeps
+METRIC_SAMPLES = 100
+
+PERCENTILES = (50, 90, 95, 99)
+
+# Metrics with names ending in this are ratios, summarized by their mean
+RATIO_SUFFIX = "_ratio"
+
+
+def _nearest_rank(ordered, percent):
+    return ordered[max(-(-percent * len(ordered) // 100), 1) - 1]
+
+
+class RollingMetric:
+    """The most recent samples of one measurement."""
+
+    def __init__(self, samples=METRIC_SAMPLES):
+        """Initialize an empty metric."""
+        self.samples = deque(maxlen=samples)
+        self.total = 0
+
+    def add(self, value):
+        """Record a sample."""
+        self.samples.append(value)
+        self.total += 1
+
+    def percentile(self, percent):
+        """Return the nearest-rank percentile of the recent samples, None if there are none."""
+        if not self.samples:
+            return None
+        return _nearest_rank(sorted(self.samples), percent)
+
+    def mean(self):
+        """Return the mean of the recent samples, None if there are none."""
+        if not self.samples:
+            return None
+        return sum(self.samples) / len(self.samples)
+
+    def summary(self, ratio=False):
+        """Return the sample count, mean, percentiles and maximum, rounded.
+
+        For a ratio, return only the sample count and the ratio.
+        """
+        if not self.samples:
+            return {"count": self.total}
+        if ratio:
+            return {"count": self.total, "ratio": round(self.mean(), 3)}
+        ordered = sorted(self.samples)
+        ret = {"count": self.total, "mean": round(sum(ordered) / len(ordered), 3)}
+        for percent in PERCENTILES:
+            ret["p" + str(percent)] = round(_nearest_rank(ordered, percent), 3)
+        ret["max"] = round(ordered[-1], 3)
+        return ret
+
+
+class DhmzMetrics:
+    """Named rolling metrics, grouped by feed or stage.
+
+    Metric names are "<group>/<measurement>", e.g. "hrvatska_n.xml/fetch_ms".
+    Times are in milliseconds and sizes in bytes. Ratios are kept as
+    samples of 0 and 1 under names ending in RATIO_SUFFIX, their mean is
+    the ratio over the recent samples.
+    """
+
+    def __init__(self):
+        """Initialize without any metric."""
+        self._metrics = {}
+
+    def get(self, name):
+        """Return the metric called name, creating it if needed."""
+        metric = self._metrics.get(name)
+        if metric is None:
+            metric = self._metrics[name] = RollingMetric()
+        return metric
+
+    def record(self, name, value):
+        """Add a sample to the metric called name."""
+        self.get(name).add(value)
+
+    @contextmanager
+    def timer(self, name):
+        """Record the wall time of the with block, in milliseconds."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, (time.perf_counter() - start) * 1000)
+
+    def group(self, group):
+        """Return {measurement: summary} of all metrics in group."""
+        prefix = group + "/"
+        return {
+            name[len(prefix):]: metric.summary(name.endswith(RATIO_SUFFIX))
+            for name, metric in sorted(self._metrics.items())
+            if name.startswith(prefix)
+        }
+
+    def as_dict(self):
+        """Return {group: {measurement: summary}} of all metrics."""
+        groups = sorted({name.split("/", 1)[0] for name in self._metrics})
+        return {group: self.group(group) for group in groups}
+
+
+def get_metrics(hass):
+    """Return the metrics shared by all DHMZ platforms."""
+    domain_data = hass.data.setdefault(DOMAIN, {})
+    if DATA_METRICS not in domain_data:
+        domain_data[DATA_METRICS] = DhmzMetrics()
+    return domain_data[DATA_METRICS]
@@ -0,0 +1,124 @@
+"""Parsers for the DHMZ XML feeds."""
+from datetime import datetime
+
+from lxml import etree
+
+from .forecast import HourlyForecast
+
+def _text(elem):
+    if elem is None or elem.text is None:
+        return ""
+    return elem.text.strip()
+
+
+def _root(source, tag):
+    root = etree.parse(source).getroot()
+    if root.tag != tag:
+        root = root.find(".//" + tag)
+    if root is None:
+        raise etree.ParserError("No <%s> element in document" % tag)
+    return root
+
+
+def parse_current_situation(source):
+    """Index hrvatska_n.xml by station name in a single pass.
+
+    Returns {"Timestamp": "d.m.Y H:M:S", "stations": {GradIme: {tag: text}}},
+    where each station record holds the Podatci values, Lat, Lon and GradIme.
+    """
+    timestamp = None
+    stations = {}
+    for elem in _root(source, "Hrvatska"):
+        if elem.tag == "Grad":
+            record = {}
+            for child in elem:
+                if child.tag == "Podatci":
+                    for value in child:
+                        record[value.tag] = _text(value)
+                elif child.tag in ("Lat", "Lon", "GradIme"):
+                    record[child.tag] = _text(child)
+            stations[record.get("GradIme")] = record
+        elif elem.tag == "DatumTermin":
+            timestamp = _text(elem.find("Datum")) + " " + _text(elem.find("Termin")) + ":00:00"
+    return {"Timestamp": timestamp, "stations": stations}
+
+
+def parse_precipitation(source):
+    """Index oborina.xml by station name in a single pass.
+
+    Returns {"kolicina_timestamp": "d.m.Y. H:M:S", "stations": {ime: kolicina}}.
+    """
+    timestamp = None
+    stations = {}
+    for elem in _root(source, "dnevna_oborina"):
+        if elem.tag == "grad":
+            amount = elem.find("kolicina")
+            if amount is not None:
+                stations[_text(elem.find("ime"))] = _text(amount)
+        elif elem.tag == "datumtermin":
+            timestamp = _text(elem.find("datum")) + " " + _text(elem.find("termin")) + ":00:00"
+    return {"kolicina_timestamp": timestamp, "stations": stations}
+
+
+def parse_forecast_daily(source):
+    """Index prognoza_danas.xml or prognoza_sutra.xml in a single pass.
+
+    Returns {"datetime": datetime, "stations": {region: {param: value}},
+    "texts": {name: value}} for every region and forecast text in the
+    document.
+    """
+    date = None
+    stations = {}
+    texts = {}
+    for elem in _root(source, "VW"):
+        if elem.tag == "section":
+            for child in elem:
+                if child.tag == "station":
+                    params = stations.setdefault(child.get("name"), {})
+                    for param in child.iterchildren("param"):
+                        params.setdefault(param.get("name"), param.get("value"))
+                elif child.tag == "param":
+                    texts.setdefault(child.get("name"), child.get("value"))
+        elif elem.tag == "metadata" and date is None:
+            date = datetime.strptime(_text(elem.find("datatime")), "%d%m%y")
+    return {"datetime": date, "stations": stations, "texts": texts}
+
+
+def _forecast_city(elem):
+    dates, hours, temperature, precipitation, wind, symbol = [], [], [], [], [], []
+    for node in elem.iterchildren(etree.Element):
+        dates.append(node.get("datum"))
+        hours.append(node.get("sat"))
+        temperature.append(node.findtext("t_2m"))
+        precipitation.append(node.findtext("oborina"))
+        wind.append(node.findtext("vjetar"))
+        symbol.append(node.findtext("simbol"))
+    return HourlyForecast.from_strings(dates, hours, temperature, precipitation, wind, symbol)
+
+
+def parse_forecast_7days(source, codes):
+    """Stream 7d_graf_i_simboli.xml and return {code: HourlyForecast} for the given cities.
+
+    The document covers every city in Croatia, so it is never built as a
+    whole: each <grad> subtree is read, cleared as soon as it was handled and
+    parsing stops once every requested city has been found. Peak memory is
+    one city's subtree.
+    """
+    ret = {}
+    wanted = set(codes)
+    if not wanted:
+        return ret
+
+    context = etree.iterparse(source, events=("end",), tag="grad")
+    for _, elem in context:
+        code = elem.get("code")
+        if code in wanted:
+            ret[code] = _forecast_city(elem)
+            wanted.discard(code)
+        elem.clear(keep_tail=True)
+        while elem.getprevious() is not None:
+            del elem.getparent()[0]
+        if not wanted:
+            break
+    del context
+    return ret
@@ -0,0 +1,409 @@
+"""Image processing for the DHMZ radar camera.
+
+Kept free of Home Assistant imports and of any state other than caches,
+so that every function here can run in an executor thread or in a worker
+process.
+"""
+from contextlib import contextmanager
+from functools import lru_cache
+from io import BytesIO
+import threading
+import time
+
+from PIL import Image, ImageChops, ImageDraw, ImageSequence
+
+MARKER_RADIUS = 4
+MARKER_FILL = (255, 0, 0)
+MARKER_OUTLINE = (0, 0, 0)
+
+# Largest squared RGB distance at which a palette color may stand in for a
+# marker color; frames without a close enough color are marked in RGBA.
+MAX_PALETTE_DISTANCE = 48 ** 2
+
+JPEG_QUALITY = 85
+
+# Encoding profiles: output format and encoder options. Each profile falls
+# back to a cheaper one when it is too slow.
+#
+# lossless: smallest WebP, slowest to encode.
+# lossy: WebP with the configured quality, Pillow's defaults otherwise.
+# fast: lossless WebP with the least effort. Radar images are mostly flat
+#     palette colors, for which this is quicker than lossy encoding.
+# gif: the downloaded GIF as is when there is nothing to draw or crop.
+ENCODING_PROFILES = {
+    "lossless": ("WEBP", {"lossless": True, "method": 4}),
+    "lossy": ("WEBP", {}),
+    "fast": ("WEBP", {"lossless": True, "quality": 0}),
+    "png": ("PNG", {}),
+    "gif": ("GIF", {}),
+}
+FALLBACK_PROFILES = {
+    "lossless": "lossy",
+    "lossy": "fast",
+    "fast": "gif",
+    "png": "gif",
+}
+# Profile used for each image_format
+FORMAT_PROFILES = {
+    "WEBP": "lossy",
+    "PNG": "png",
+    "GIF": "gif",
+}
+DEFAULT_QUALITY = 80
+
+# Decoded frames kept by render_frames, enough for one full animation plus
+# the newest frame
+FRAME_CACHE_SIZE = 26
+
+# Makes cameras rendering at the same time wait for one decode, instead of
+# all of them missing the cache
+_decode_lock = threading.Lock()
+
+# CPU time of each stage of the render that timed() runs in this thread
+_stage_times = threading.local()
+
+
+def marker_position(longitude, latitude, size):
+    """Project coordinates onto the DHMZ radar composite, in pixels."""
+    x_coord = int((0.11346541830650277 * longitude - 1.3351816168381) * float(size[0]))
+    y_coord = int((-0.15304197356993342 * latitude + 7.31403749212996) * float(size[1]))
+    return x_coord, y_coord
+
+
+@lru_cache(maxsize=1)
+def marker_sprite():
+    """Return the marker as an RGBA sprite, with its fill and outline masks."""
+    size = 2 * MARKER_RADIUS + 1
+    sprite = Image.new("RGBA", (size, size), (0, 0, 0, 0))
+    ImageDraw.Draw(sprite).ellipse((0, 0, size - 1, size - 1), fill=MARKER_FILL, outline=MARKER_OUTLINE)
+    fill_mask = Image.new("L", (size, size), 0)
+    ImageDraw.Draw(fill_mask).ellipse((0, 0, size - 1, size - 1), fill=255, outline=0)
+    outline_mask = ImageChops.subtract(sprite.getchannel("A"), fill_mask)
+    return sprite, fill_mask, outline_mask
+
+
+@lru_cache(maxsize=16)
+def marker_overlay(longitude, latitude, size):
+    """Return the marker sprite, masks and paste position for one image size.
+
+    Cached, so the projection and the sprite are computed once for as long
+    as the coordinates and the radar image size stay the same.
+    """
+    x_coord, y_coord = marker_position(longitude, latitude, size)
+    return ((x_coord - MARKER_RADIUS, y_coord - MARKER_RADIUS),) + marker_sprite()
+
+
+@lru_cache(maxsize=16)
+def _palette_indices(palette, transparency):
+    """Return the palette indices closest to the marker colors, or None."""
+    def nearest(color):
+        best = None
+        for index in range(len(palette) // 3):
+            if index == transparency:
+                continue
+            distance = sum((a - b) ** 2 for a, b in zip(palette[3 * index:3 * index + 3], color))
+            if best is None or distance < best[1]:
+                best = (index, distance)
+        return best
+
+    fill = nearest(MARKER_FILL)
+    outline = nearest(MARKER_OUTLINE)
+    if fill is None or outline is None or max(fill[1], outline[1]) > MAX_PALETTE_DISTANCE:
+        return None
+    return fill[0], outline[0]
+
+
+def draw_marker(frame, overlay):
+    """Draw the location marker on frame, in place when possible.
+
+    Palette frames stay in palette mode, using the palette colors closest to
+    the marker colors. Only palettes without such colors need RGBA.
+    """
+    position, sprite, fill_mask, outline_mask = overlay
+    if frame.mode == "P":
+        indices = _palette_indices(bytes(frame.getpalette() or ()), frame.info.get("transparency"))
+        if indices is not None:
+            frame.paste(indices[0], position, fill_mask)
+            frame.paste(indices[1], position, outline_mask)
+            return frame
+        frame = frame.convert("RGBA")
+    elif frame.mode not in ("RGB", "RGBA"):
+        frame = frame.convert("RGBA")
+    frame.paste(sprite, position, sprite)
+    return frame
+
+
+def _webp_frame(frame):
+    # The WebP encoder converts palette frames to RGB, which would drop a
+    # transparent palette index
+    if frame.mode == "P" and "transparency" in frame.info:
+        return frame.convert("RGBA")
+    return frame
+
+
+def _frames(im, fmt):
+    """Yield copies of the frames of im, with their durations.
+
+    Pillow loads the frames after the first one as RGB. For GIF output they
+    are mapped back onto the palette of the first frame, which is much
+    cheaper than the adaptive quantization the GIF encoder would do.
+    """
+    palette_frame = None
+    for frame in ImageSequence.Iterator(im):
+        frame_copied = frame.copy()
+        if fmt == "GIF":
+            if palette_frame is None and frame_copied.mode == "P":
+                palette_frame = frame_copied
+            elif palette_frame is not None and frame_copied.mode == "RGB":
+                frame_copied = frame_copied.quantize(palette=palette_frame, dither=Image.Dither.NONE)
+        yield frame_copied, frame.info.get('duration', 100)
+
+
+def _save(frames, durations, fmt, **options):
+    if fmt == "WEBP":
+        frames = [_webp_frame(frame) for frame in frames]
+
+    # Frames sharing the palette of the first one gain little from the
+    # encoder's per-frame palette optimization, which dominates encode time.
+    optimize = fmt != "GIF" or any(frame.mode != "P" for frame in frames)
+    file_bytes_io = BytesIO()
+    frames[0].save(
+        file_bytes_io,
+        format=fmt,
+        save_all=True,
+        append_images=frames[1:],
+        optimize=optimize,
+        duration=durations,
+        loop=0,
+        **options
+    )
+    return file_bytes_io.getvalue()
+
+
+def _encode(frames, durations, profile, quality):
+    fmt, options = ENCODING_PROFILES[profile]
+    if profile == "lossy":
+        options = dict(options, quality=quality)
+    return _save(frames, durations, fmt, **options)
+
+
+def profile_for_format(image_format):
+    """Return the encoding profile producing image_format, None if there is none."""
+    return FORMAT_PROFILES.get((image_format or "GIF").upper())
+
+
+@contextmanager
+def _stage(name):
+    start = time.thread_time()
+    try:
+        yield
+    finally:
+        stages = getattr(_stage_times, "stages", None)
+        if stages is not None:
+            stages[name] = stages.get(name, 0.0) + (time.thread_time() - start) * 1000
+
+
+def timed(target, *args):
+    """Call target and return its result with the CPU time it took, in milliseconds.
+
+    Returns (result, total time, {stage: time}), the stages being decode,
+    compose (crop, merge and marker) and encode.
+    """
+    _stage_times.stages = stages = {}
+    start = time.thread_time()
+    try:
+        result = target(*args)
+    finally:
+        _stage_times.stages = None
+    return result, (time.thread_time() - start) * 1000, stages
+
+
+@lru_cache(maxsize=1)
+def _decode_radar(content):
+    return tuple(_frames(Image.open(BytesIO(content)), "GIF"))
+
+
+def decode_radar(content):
+    """Return the frames of a DHMZ radar GIF, with their durations.
+
+    Cached, so cameras rendering the same GIF decode it only once. All
+    frames share the palette of the first one where possible, which suits
+    any output format. The frames are shared and must not be modified.
+    """
+    with _decode_lock:
+        return _decode_radar(content)
+
+
+@lru_cache(maxsize=16)
+def crop_box(longitude, latitude, size, crop_size):
+    """Return the crop_size square around the coordinates, inside an image of size."""
+    x_coord, y_coord = marker_position(longitude, latitude, size)
+    box = []
+    for coord, length in ((x_coord, size[0]), (y_coord, size[1])):
+        side = min(crop_size, length)
+        box.append(min(max(coord - side // 2, 0), length - side))
+    return box[0], box[1], box[0] + min(crop_size, size[0]), box[1] + min(crop_size, size[1])
+
+
+def _same_frame(frame, previous):
+    if frame is previous:
+        return True
+    return (
+        frame.mode == previous.mode
+        and frame.size == previous.size
+        and frame.getpalette() == previous.getpalette()
+        and frame.tobytes() == previous.tobytes()
+    )
+
+
+def _compose(decoded, show_location, longitude, latitude, crop_size):
+    """Return the frames and durations to encode from shared decoded frames.
+
+    Frames are cropped around the coordinates when crop_size is given, and
+    marked when show_location is. Consecutive frames that are the same,
+    after cropping, are merged into one shown for their total duration.
+    """
+    size = decoded[0][0].size
+    box = crop_box(longitude, latitude, size, crop_size) if crop_size else None
+    overlay = marker_overlay(longitude, latitude, size) if show_location else None
+    if box is not None and overlay is not None:
+        position = (overlay[0][0] - box[0], overlay[0][1] - box[1])
+        overlay = (position,) + overlay[1:]
+
+    frames = []
+    durations = []
+    previous = None
+    for frame, duration in decoded:
+        if box is not None:
+            frame = frame.crop(box)
+        if previous is not None and _same_frame(frame, previous):
+            durations[-1] += duration
+            continue
+        previous = frame
+        if overlay is not None:
+            # the decoded frames are shared, a cropped frame is already a copy
+            frame = draw_marker(frame if box is not None else frame.copy(), overlay)
+        frames.append(frame)
+        durations.append(duration)
+    return frames, durations
+
+
+def render_radar(content, show_location, longitude, latitude, profile, crop_size=0, quality=DEFAULT_QUALITY):
+    """Return the animation to serve for a downloaded DHMZ radar GIF."""
+    if not show_location and not crop_size and profile == "gif":
+        return content
+
+    with _stage("decode"):
+        decoded = decode_radar(content)
+    with _stage("compose"):
+        frames, durations = _compose(decoded, show_location, longitude, latitude, crop_size)
+    with _stage("encode"):
+        return _encode(frames, durations, profile, quality)
+
+
+def scaled_size(size, width, height):
+    """Return size scaled down to fit width and height, keeping its aspect.
+
+    A missing width or height does not constrain the result. Returns None
+    when no scaling down is needed.
+    """
+    scale = min(
+        width / size[0] if width else 1.0,
+        height / size[1] if height else 1.0,
+    )
+    if scale >= 1.0:
+        return None
+    return max(1, round(size[0] * scale)), max(1, round(size[1] * scale))
+
+
+def resize_radar(content, width, height):
+    """Return the animation in content scaled down to fit width and height.
+
+    The animation keeps its format and frame durations. Returns content
+    itself when it already fits.
+    """
+    im = Image.open(BytesIO(content))
+    fmt = im.format
+    size = scaled_size(im.size, width, height)
+    if size is None or fmt not in ("GIF", "WEBP", "PNG"):
+        return content
+
+    frames = []
+    durations = []
+    for frame, duration in _frames(im, fmt):
+        # Palette frames can only be resized with nearest neighbour sampling,
+        # which keeps them in palette mode
+        frames.append(frame.resize(size, Image.Resampling.BILINEAR, reducing_gap=2.0))
+        durations.append(duration)
+    return _save(frames, durations, fmt)
+
+
+@lru_cache(maxsize=FRAME_CACHE_SIZE)
+def _decode_frame(content):
+    frame = Image.open(BytesIO(content))
+    frame.load()
+    return frame
+
+
+def decode_frame(content):
+    """Return the decoded frame in content.
+
+    Cached by content, so a frame that only moved to another position of
+    the animation, or that another camera renders too, is not decoded
+    again. The frame is shared and must not be modified.
+    """
+    with _decode_lock:
+        return _decode_frame(content)
+
+
+def render_frames(contents, durations, show_location, longitude, latitude, profile, crop_size=0, quality=DEFAULT_QUALITY):
+    """Return an animation assembled from individually downloaded frames.
+
+    Only frames that were not seen before get decoded.
+    """
+    with _stage("decode"):
+        decoded = [(decode_frame(content), duration) for content, duration in zip(contents, durations)]
+    with _stage("compose"):
+        frames, durations = _compose(decoded, show_location, longitude, latitude, crop_size)
+    with _stage("encode"):
+        return _encode(_palette_frames(frames, profile), durations, profile, quality)
+
+
+def _palette_frames(frames, profile):
+    if ENCODING_PROFILES[profile][0] == "GIF":
+        # Map all frames onto one palette, like _frames does for GIF input
+        palette_frame = next((frame for frame in frames if frame.mode == "P"), None)
+        if palette_frame is None:
+            palette_frame = frames[0].convert("RGB").quantize()
+        frames = [
+            frame if frame.mode == "P" and frame.getpalette() == palette_frame.getpalette()
+            else frame.convert("RGB").quantize(palette=palette_frame, dither=Image.Dither.NONE)
+            for frame in frames
+        ]
+    return frames
+
+
+def _rgb_frame(frame):
+    # JPEG has no transparency, show transparent areas as white
+    if frame.mode == "P" and "transparency" in frame.info:
+        frame = frame.convert("RGBA")
+    if frame.mode == "RGBA":
+        background = Image.new("RGB", frame.size, (255, 255, 255))
+        background.paste(frame, mask=frame.getchannel("A"))
+        return background
+    return frame.convert("RGB")
+
+
+def jpeg_frames(content, quality=JPEG_QUALITY):
+    """Return the frames of the animation in content as JPEG images.
+
+    Returns a list of (JPEG bytes, duration in milliseconds) tuples.
+    """
+    im = Image.open(BytesIO(content))
+    frames = []
+    for frame in ImageSequence.Iterator(im):
+        frame.load()
+        file_bytes_io = BytesIO()
+        _rgb_frame(frame).save(file_bytes_io, format="JPEG", quality=quality)
+        frames.append((file_bytes_io.getvalue(), frame.info.get('duration', 100)))
+    return frames
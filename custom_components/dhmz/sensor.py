@@ -4,9 +4,8 @@ import gzip
 import json
 import logging
 import os
-from urllib.request import urlopen, URLError, HTTPError
-from http.client import RemoteDisconnected
-from lxml import etree
+from types import MappingProxyType
+from urllib.request import urlopen
 import voluptuous as vol
 
 from homeassistant.components.weather import (
@@ -25,9 +24,23 @@ from homeassistant.const import (
     CONF_MONITORED_CONDITIONS,
     __version__,
 )
+from homeassistant.core import callback
 import homeassistant.helpers.config_validation as cv
-from homeassistant.helpers.entity import Entity
-from homeassistant.util import Throttle
+from homeassistant.helpers.entity import Entity, EntityCategory
+from homeassistant.exceptions import PlatformNotReady
+from homeassistant.helpers.update_coordinator import CoordinatorEntity, DataUpdateCoordinator, UpdateFailed
+from homeassistant.util import dt as dt_util
+
+from . import DOMAIN
+from .feed import FeedSchedule, feed_name, get_feed_cache
+from .metrics import get_metrics
+from .parser import (
+    parse_current_situation,
+    parse_forecast_daily,
+    parse_forecast_7days,
+    parse_precipitation,
+)
+from .tasks import SingleFlight
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -49,7 +62,17 @@ FORECAST_TODAY_API_URL = "https://prognoza.hr/prognoza_danas.xml"
 FORECAST_TOMORROW_API_URL = "https://prognoza.hr/prognoza_sutra.xml"
 FORECAST_7DAYS_API_URL = "https://meteo.hr/7d_graf_i_simboli.xml"
 
-MIN_TIME_BETWEEN_UPDATES = timedelta(minutes=15)
+FEED_PARSERS = {
+    CURRENT_SITUATION_API_URL: (parse_current_situation,),
+    PRECIPITATION_API_URL: (parse_precipitation,),
+    FORECAST_TODAY_API_URL: (parse_forecast_daily,),
+    FORECAST_TOMORROW_API_URL: (parse_forecast_daily,),
+}
+
+DATA_HUB = "hub"
+
+# Shortest time between two hub refreshes, however soon a feed is due
+MIN_UPDATE_INTERVAL = timedelta(seconds=30)
 
 SENSOR_TYPES = {
     # from "hrvatska_n.xml"
@@ -95,8 +118,18 @@ PLATFORM_SCHEMA = cv.PLATFORM_SCHEMA.extend(
     }
 )
 
-def setup_platform(hass, config, add_entities, discovery_info=None):
+async def async_setup_platform(hass, config, async_add_entities, discovery_info=None):
     """Set up the DHMZ sensor platform."""
+    if discovery_info is not None:
+        # Loaded by the integration, once for any set of platforms: the
+        # metrics are process-wide
+        metrics = get_metrics(hass)
+        async_add_entities([
+            DhmzMetricSensor(metrics, group, measurement, DEFAULT_NAME)
+            for group, measurement in METRIC_SENSORS.items()
+        ])
+        return
+
     name = config.get(CONF_NAME)
     station_name = config.get(CONF_STATION_NAME)
     forecast_region_name = config.get(CONF_FORECAST_REGION_NAME)
@@ -119,30 +152,29 @@ def setup_platform(hass, config, add_entities, discovery_info=None):
     #     )
     #     return False
 
-    probe = DhmzData(station_name=station_name, forecast_region_name=forecast_region_name, forecast_text=forecast_text, forecast_station_name=forecast_station_name)
-    try:
-        probe.update()
-    except (ValueError, TypeError) as err:
-        _LOGGER.error("Received error from DHMZ: %s", err)
-        return False
+    hub = get_dhmz_hub(hass)
+    probe = hub.get_data(station_name=station_name, forecast_region_name=forecast_region_name, forecast_text=forecast_text, forecast_station_name=forecast_station_name)
+    await probe.async_update()
+    if not hub.last_update_success:
+        raise PlatformNotReady("Received no data from DHMZ")
 
-    add_entities(
-        [
-            DhmzSensor(probe, variable, name)
-            for variable in config[CONF_MONITORED_CONDITIONS]
-        ],
-        True,
-    )
+    entities = [
+        DhmzSensor(hub, probe, variable, name)
+        for variable in config[CONF_MONITORED_CONDITIONS]
+    ]
+    async_add_entities(entities)
 
 
-class DhmzSensor(Entity):
+class DhmzSensor(CoordinatorEntity):
     """Implementation of a DHMZ sensor."""
 
-    def __init__(self, probe, variable, name):
+    def __init__(self, hub, probe, variable, name):
         """Initialize the sensor."""
+        super().__init__(hub)
         self.probe = probe
         self.client_name = name
         self.variable = variable
+        self._written = None
         _LOGGER.debug("Initializing: %s", variable)
 
     @property
@@ -158,10 +190,10 @@ class DhmzSensor(Entity):
     @property
     def state(self):
         """Return the state of the sensor."""
-        if (self.variable == "forecast_text_today") or (self.variable == "forecast_text_tomorrow"):
-            return self.probe.get_data(SENSOR_TYPES[self.variable][4])[:255]
-        else:
-            return self.probe.get_data(SENSOR_TYPES[self.variable][4])
+        value = self.probe.get_data(SENSOR_TYPES[self.variable][4])
+        if value is not None and ((self.variable == "forecast_text_today") or (self.variable == "forecast_text_tomorrow")):
+            return value[:255]
+        return value
 
     @property
     def device_class(self):
@@ -181,15 +213,16 @@ class DhmzSensor(Entity):
     @property
     def extra_state_attributes(self):
         """Return the state attributes."""
+        snapshot = self.probe.snapshot
         ret = {
-            ATTR_STATION: self.probe.get_data(SENSOR_TYPES["station_name"][4]),
+            ATTR_STATION: snapshot.data.get(SENSOR_TYPES["station_name"][4]),
         }
         if self.variable == "precipitation":
-            ret[ATTR_UPDATED] = self.probe.last_update_precipitation
+            ret[ATTR_UPDATED] = snapshot.last_update_precipitation
         else:
-            ret[ATTR_UPDATED] = self.probe.last_update
+            ret[ATTR_UPDATED] = snapshot.last_update
         if self.variable == ATTR_WEATHER_PRESSURE:
-            ret["pressure_tendency"] = (self.probe.get_data(SENSOR_TYPES["pressure_tendency"][4]) or "?") + " hPa"
+            ret["pressure_tendency"] = (snapshot.data.get(SENSOR_TYPES["pressure_tendency"][4]) or "?") + " hPa"
         return(ret)
 
     @property
@@ -201,243 +234,426 @@ class DhmzSensor(Entity):
             "https://meteo.hr/assets/images/icons/{0}.svg".format(self.probe.get_data(SENSOR_TYPES["weather_symbol"][4]))
         )
 
-    def update(self):
-        """Delegate update to probe."""
-        self.probe.update()
+    def _value(self):
+        if not self.available:
+            return None
+        return (self.state, self.extra_state_attributes, self.entity_picture)
+
+    async def async_added_to_hass(self):
+        """Remember the state written when the entity was added."""
+        await super().async_added_to_hass()
+        self._written = self._value()
+
+    @callback
+    def _handle_coordinator_update(self):
+        """Write the state only if this sensor's value changed."""
+        value = self._value()
+        if value == self._written:
+            return
+        self._written = value
+        self.async_write_ha_state()
+
+
+class DhmzMetricSensor(Entity):
+    """Diagnostic sensor of one group of DhmzMetrics.
+
+    The state is the 95th percentile of the group's main measurement, the
+    attributes hold the summaries of all measurements in the group.
+    """
+
+    _attr_entity_category = EntityCategory.DIAGNOSTIC
+    _attr_entity_registry_enabled_default = False
+
+    def __init__(self, metrics, group, measurement, name):
+        """Initialize the sensor."""
+        self.metrics = metrics
+        self.group = group
+        self.measurement = measurement
+        self.client_name = name
+
+    @property
+    def unique_id(self):
+        """Return the unique ID of the sensor."""
+        return f"{DOMAIN}_metrics_{self.group}"
+
+    @property
+    def name(self):
+        """Return the name of the sensor."""
+        return f"{self.client_name} {self.group} {self.measurement} p95"
+
+    @property
+    def icon(self):
+        """Return the icon of the sensor."""
+        return "mdi:timer-outline"
+
+    @property
+    def state(self):
+        """Return the 95th percentile of the main measurement."""
+        value = self.metrics.get(self.group + "/" + self.measurement).percentile(95)
+        return round(value, 1) if value is not None else None
+
+    @property
+    def state_class(self):
+        """Return the state_class of this entity."""
+        return "measurement"
+
+    @property
+    def unit_of_measurement(self):
+        """Return the unit of measurement of this entity."""
+        return "ms"
+
+    @property
+    def extra_state_attributes(self):
+        """Return the summaries of all measurements in the group."""
+        return self.metrics.group(self.group)
+
+
+class DhmzHub(DataUpdateCoordinator):
+    """One refresh of the DHMZ feeds, serving every configured station.
+
+    The indexes of hrvatska_n.xml, oborina.xml and the daily forecasts cover
+    every station and region, and 7d_graf_i_simboli.xml is streamed once
+    for the set of all registered forecast stations. The cost of a refresh
+    grows with the number of feeds, not with the number of stations.
+
+    The hub is the coordinator of all DHMZ entities: it wakes up when the
+    first feed is due, updates every DhmzData view from one refresh, and
+    notifies the entities only when a view got a new snapshot. When every
+    feed failed, the refresh fails: the views keep their data, but the
+    entities are unavailable until a later refresh succeeds.
+
+    Refreshes are single-flight: platform setup, the scheduled refresh and
+    update requests that come in while one is running all wait for it, and
+    share its result, instead of starting another.
+    """
+
+    def __init__(self, hass, feeds):
+        """Initialize the hub."""
+        super().__init__(hass, _LOGGER, name=DOMAIN, update_interval=MIN_UPDATE_INTERVAL, always_update=False)
+        self._feeds = feeds
+        self._probes = {}
+        self._forecast_stations = set()
+        self._refreshing = SingleFlight()
+
+    def get_data(self, station_name, forecast_region_name, forecast_text, forecast_station_name):
+        """Return the DhmzData view for one station, shared by all its entities."""
+        key = (station_name, forecast_region_name, forecast_text, forecast_station_name)
+        probe = self._probes.get(key)
+        if probe is None:
+            probe = self._probes[key] = DhmzData(self, *key)
+            self._forecast_stations.add(forecast_station_name)
+        return probe
+
+    async def _async_update_data(self):
+        """Join the refresh in flight, or start one.
+
+        Returns the tuple of the views' snapshots, which compares equal to
+        the previous one, and notifies no entity, when nothing changed.
+        """
+        return await self._refreshing.async_run(self.hass, DOMAIN, self._async_update_views)
+
+    async def _async_update_views(self):
+        """Fetch all feeds concurrently and update every DhmzData view."""
+        # All five feeds are fetched concurrently, so the refresh takes as long
+        # as the slowest feed rather than the sum of all of them.
+        stations = frozenset(self._forecast_stations)
+        parsed = await self._feeds.async_get_many({
+            **FEED_PARSERS,
+            FORECAST_7DAYS_API_URL: (parse_forecast_7days, stations),
+        })
+        # Also after a failed refresh, the failed feeds are retried on their
+        # own schedules
+        self._set_update_interval()
+        if all(result is None for result in parsed.values()):
+            # The views keep their last data, the entities are unavailable
+            # until a feed is fetched again
+            raise UpdateFailed("Failed to fetch any DHMZ feed")
+        # A forecast station registered while the feeds were fetched joined
+        # this refresh, parse the 7 day forecast again to include it. The
+        # body is cached by now, this does not download it again.
+        while stations != self._forecast_stations:
+            stations = frozenset(self._forecast_stations)
+            parsed[FORECAST_7DAYS_API_URL] = await self._feeds.async_get(FORECAST_7DAYS_API_URL, parse_forecast_7days, stations)
+        with get_metrics(self.hass).timer("hub/extract_ms"):
+            for probe in self._probes.values():
+                probe.update(parsed)
+
+        return tuple(probe.snapshot for probe in self._probes.values())
+
+    def _set_update_interval(self):
+        """Sleep until the first feed is due, but at least MIN_UPDATE_INTERVAL."""
+        next_poll = self._feeds.next_poll()
+        interval = MIN_UPDATE_INTERVAL
+        if next_poll is not None:
+            interval = max(next_poll - dt_util.utcnow(), MIN_UPDATE_INTERVAL)
+        self.update_interval = interval
+        _LOGGER.debug("Next DHMZ refresh in %s", interval)
+
+
+def _daily_published(daily):
+    return daily["datetime"]
+
+
+# {url: (period, retry, max interval, publication time of a parsed feed)}
+#
+# Observations are published hourly and the precipitation total daily. The
+# daily forecasts carry only their date, and are polled every few hours on
+# top of that for the updates DHMZ issues during the day. The 7 day forecast
+# has no timestamp at all, the time it is seen changing is used instead.
+FEED_SCHEDULES = {
+    CURRENT_SITUATION_API_URL: (
+        timedelta(hours=1), timedelta(minutes=5), None,
+        lambda current: _parse_timestamp(current["Timestamp"], "%d.%m.%Y %H:%M:%S"),
+    ),
+    PRECIPITATION_API_URL: (
+        timedelta(days=1), timedelta(minutes=15), None,
+        lambda precipitation: _parse_timestamp(precipitation["kolicina_timestamp"], "%d.%m.%Y. %H:%M:%S"),
+    ),
+    FORECAST_TODAY_API_URL: (timedelta(days=1), timedelta(minutes=15), timedelta(hours=3), _daily_published),
+    FORECAST_TOMORROW_API_URL: (timedelta(days=1), timedelta(minutes=15), timedelta(hours=3), _daily_published),
+    FORECAST_7DAYS_API_URL: (timedelta(hours=12), timedelta(minutes=30), timedelta(hours=3), None),
+}
+
+# Diagnostic sensors, {metrics group: measurement shown as the state}
+METRIC_SENSORS = {
+    **{feed_name(url): "fetch_ms" for url in FEED_SCHEDULES},
+    "hub": "extract_ms",
+    "radar": "render_ms",
+}
+
+
+def get_dhmz_hub(hass):
+    """Return the hub shared by all DHMZ platforms."""
+    domain_data = hass.data.setdefault(DOMAIN, {})
+    if DATA_HUB not in domain_data:
+        feeds = get_feed_cache(hass)
+        for url, schedule in FEED_SCHEDULES.items():
+            feeds.set_schedule(url, FeedSchedule(*schedule))
+        domain_data[DATA_HUB] = DhmzHub(hass, feeds)
+    return domain_data[DATA_HUB]
+
+
+def _parse_timestamp(date_time, date_format):
+    if date_time is None:
+        return None
+    try:
+        return datetime.strptime(date_time, date_format)
+    except ValueError:
+        _LOGGER.warning("Invalid DHMZ timestamp: %s", date_time)
+        return None
+
+
+class DhmzSnapshot:
+    """Immutable result of one DhmzData update.
+
+    Holds plain values only, with the timestamps parsed once, and is
+    replaced as a whole on every update. Readers always see one complete
+    update cycle, and no parsed feed is kept alive through it. Nested
+    values are frozen as well: data and every forecast_daily day are
+    read-only mappings, and the HourlyForecast is immutable.
+    """
+
+    __slots__ = ("data", "last_update", "last_update_precipitation", "forecast_daily", "forecast_hourly")
+
+    def __init__(self, data, forecast_daily=(), forecast_hourly=None):
+        """Initialize the snapshot."""
+        data = MappingProxyType(dict(data))
+        object.__setattr__(self, "data", data)
+        object.__setattr__(self, "last_update", _parse_timestamp(data.get("Timestamp"), "%d.%m.%Y %H:%M:%S"))
+        object.__setattr__(self, "last_update_precipitation", _parse_timestamp(data.get("kolicina_timestamp"), "%d.%m.%Y. %H:%M:%S"))
+        object.__setattr__(self, "forecast_daily", tuple(MappingProxyType(dict(day)) for day in forecast_daily))
+        object.__setattr__(self, "forecast_hourly", forecast_hourly)
+
+    def __setattr__(self, name, value):
+        """Refuse to modify the snapshot."""
+        raise AttributeError("DhmzSnapshot is immutable")
+
+    __delattr__ = __setattr__
+
 
 class DhmzData:
     """The class for handling the data retrieval."""
 
+    _hub = None
     _station_name = ""
     _forecast_region_name = ""
     _forecast_text = ""
     _forecast_station_name = ""
-    _data = {}
-    _forecast_daily = []
-    _forecast_hourly = []
-    _current_situation = []
+    _snapshot = None
+    _parsed = {}
 
-    def __init__(self, station_name, forecast_region_name, forecast_text, forecast_station_name):
+    def __init__(self, hub, station_name, forecast_region_name, forecast_text, forecast_station_name):
         """Initialize the probe."""
+        self._hub = hub
         self._station_name = station_name
         self._forecast_region_name = forecast_region_name
         self._forecast_text = forecast_text
         self._forecast_station_name = forecast_station_name
-        self._data = {}
-        self._forecast_daily = []
-        self._forecast_hourly = []
-        self._current_situation = []
+        self._snapshot = DhmzSnapshot({})
+        self._parsed = {}
         _LOGGER.debug("Initialized sensor data: %s, %s, %s, %s", station_name, forecast_region_name, forecast_text, forecast_station_name)
 
+    @property
+    def snapshot(self):
+        """Return the DhmzSnapshot of the latest update."""
+        return self._snapshot
+
     @property
     def last_update(self):
         """Return the timestamp of the most recent data."""
-        date_time = self._data.get("Timestamp")
-        if date_time is not None:
-            return datetime.strptime(date_time, "%d.%m.%Y %H:%M:%S")
+        return self._snapshot.last_update
 
     @property
     def last_update_precipitation(self):
         """Return the timestamp of the most recent precipitation data."""
-        date_time = self._data.get("kolicina_timestamp")
-        if date_time is not None:
-            return datetime.strptime(date_time, "%d.%m.%Y. %H:%M:%S")
-
-    def current_situation(self):
-        """Fetch and parse the latest XML data."""
-        try:
-            _LOGGER.debug("Refreshing current_situation - hrvatska_n.xml")
-            elems = []
-            # get current weather "hrvatska_n.xml"
-            tree = etree.parse(urlopen(CURRENT_SITUATION_API_URL))
-            elems = tree.xpath("//Hrvatska/Grad[GradIme='" + self._station_name + "']/Podatci/*")
-            elem_lat = tree.xpath("//Hrvatska/Grad[GradIme='" + self._station_name + "']/Lat")
-            elem_lon = tree.xpath("//Hrvatska/Grad[GradIme='" + self._station_name + "']/Lon")
-            elem_gradime = tree.xpath("//Hrvatska/Grad[GradIme='" + self._station_name + "']/GradIme")
-            elems.extend(elem_lat)
-            elems.extend(elem_lon)
-            elems.extend(elem_gradime)
-            vardt = etree.Element("Timestamp")
-            vardt.text = tree.xpath("//Hrvatska/DatumTermin/Datum/text()")[0] + " " + tree.xpath("//Hrvatska/DatumTermin/Termin/text()")[0] + ":00:00"
-            elems.extend([vardt])
+        return self._snapshot.last_update_precipitation
+
+    def current_situation(self, current, precipitation):
+        """Look up the station in the hrvatska_n.xml and oborina.xml indexes."""
+        if current is None:
+            return None
+
+        _LOGGER.debug("Refreshing current_situation - hrvatska_n.xml")
+        # get current weather "hrvatska_n.xml"
+        ret = dict(current["stations"].get(self._station_name, {}))
+        ret["Timestamp"] = current["Timestamp"]
 
+        if precipitation is not None:
             _LOGGER.debug("Refreshing current_situation - oborine.xml")
             # get precipitation "oborine.xml"
-            tree = etree.parse(urlopen(PRECIPITATION_API_URL))
-            elem_kisa = tree.xpath("//dnevna_oborina/grad[ime='" + self._station_name + "']/kolicina")
-            if elem_kisa: 
-                elems.extend(elem_kisa)
-                vardt_kisa = etree.Element("kolicina_timestamp")
-                vardt_kisa.text = tree.xpath("//dnevna_oborina/datumtermin/datum/text()")[0] + " " + tree.xpath("//dnevna_oborina/datumtermin/termin/text()")[0] + ":00:00"
-                elems.extend([vardt_kisa])
-
-            #return data back
-            return elems
-
-        except HTTPError as err:
-            _LOGGER.error("HTTP error: %s", err.reason )
-        except URLError as err:
-            _LOGGER.error("URL error: %s", err.reason )
-        except etree.ParseError as err:
-            _LOGGER.error("LXML PARSE error: %s as position: %s, offset: %s, line: %s", err.msg, err.position, err.offset, err.lineno )
-        except etree.ParserError as err:
-            _LOGGER.error("LXML PARSER error: %s", err.message )
-        except etree.XMLSyntaxError as err:
-            _LOGGER.error("LXML XML SYNTAX error: %s as position: %s, offset: %s, line: %s", err.msg, err.position, err.offset, err.lineno )
-        except RemoteDisconnected as err:
-            _LOGGER.error("HTTP Remote end disconnected")
-
-    def forecast_daily(self):
-        """Fetch and parse the latest daily forecast XML data."""
-        try:
-            _LOGGER.debug("Refreshing forecast_daily - prognoza_danas.xml")
-            ret = []
-            elems = {}
-            # get "prognoza_danas.xml"
-            tree = etree.parse(urlopen(FORECAST_TODAY_API_URL))
-            val_condition = tree.xpath("//VW/section/station[@name='" + self._forecast_region_name + "']/param[@name='vrijeme']/@value")[0]
-            val_temp_min = tree.xpath("//VW/section/station[@name='" + self._forecast_region_name + "']/param[@name='Tmn']/@value")[0]
-            val_temp_max = tree.xpath("//VW/section/station[@name='" + self._forecast_region_name + "']/param[@name='Tmx']/@value")[0]
-            val_wind = tree.xpath("//VW/section/station[@name='" + self._forecast_region_name + "']/param[@name='wind']/@value")[0]
-            val_text = tree.xpath("//VW/section/param[@name='" + self._forecast_text + "']/@value")[0]
-            val_datetime = tree.xpath("//VW/metadata/datatime/text()")[0] + " 00:00:00"
-            elems["vrijeme"] = val_condition
-            elems["Tmx"] = val_temp_max
-            elems["Tmn"] = val_temp_min
-            elems["wind"] = val_wind
-            elems["text"] = val_text
-            elems["datetime"] = datetime.strptime(val_datetime, "%d%m%y %H:%M:%S")
-            ret.append(elems)
-
-            _LOGGER.debug("Refreshing forecast_daily - prognoza_sutra.xml")
-            elems_tm = {}
-            # get "prognoza_sutra.xml"
-            tree = etree.parse(urlopen(FORECAST_TOMORROW_API_URL))
-            val_condition = tree.xpath("//VW/section/station[@name='" + self._forecast_region_name + "']/param[@name='vrijeme']/@value")[0]
-            val_temp_min = tree.xpath("//VW/section/station[@name='" + self._forecast_region_name + "']/param[@name='Tmn']/@value")[0]
-            val_temp_max = tree.xpath("//VW/section/station[@name='" + self._forecast_region_name + "']/param[@name='Tmx']/@value")[0]
-            val_wind = tree.xpath("//VW/section/station[@name='" + self._forecast_region_name + "']/param[@name='wind']/@value")[0]
-            val_text = tree.xpath("//VW/section/param[@name='" + self._forecast_text + "']/@value")[0]
-            val_datetime = tree.xpath("//VW/metadata/datatime/text()")[0] + " 00:00:00"
-            elems_tm["vrijeme"] = val_condition
-            elems_tm["Tmx"] = val_temp_max
-            elems_tm["Tmn"] = val_temp_min
-            elems_tm["wind"] = val_wind
-            elems_tm["text"] = val_text
-            elems_tm["datetime"] = (datetime.strptime(val_datetime, "%d%m%y %H:%M:%S") + timedelta(days=1))
-            ret.append(elems_tm)
-            
-            # return data back
-            return ret
-
-        except HTTPError as err:
-            _LOGGER.error("HTTP error: %s", err.reason )
-        except URLError as err:
-            _LOGGER.error("URL error: %s", err.reason )
-        except etree.ParseError as err:
-            _LOGGER.error("LXML PARSE error: %s as position: %s, offset: %s, line: %s", err.msg, err.position, err.offset, err.lineno )
-        except etree.ParserError as err:
-            _LOGGER.error("LXML PARSER error: %s", err.message )
-        except etree.XMLSyntaxError as err:
-            _LOGGER.error("LXML XML SYNTAX error: %s as position: %s, offset: %s, line: %s", err.msg, err.position, err.offset, err.lineno )
-        except RemoteDisconnected as err:
-            _LOGGER.error("HTTP Remote end disconnected")
-
-    def forecast_hourly(self):
-        """Fetch and parse the latest daily forecast XML data."""
-        try:
-            ret = []
-            _LOGGER.debug("Refreshing forecast_hourly -7d_graf_i_simboli.xml")
-            # get forecast weather "7d_graf_i_simboli.xml"
-            tree = etree.parse(urlopen(FORECAST_7DAYS_API_URL))
-            node_days = tree.xpath("//sedamdana/grad[@code='" + self._forecast_station_name + "']/*")
-            for node in node_days:
-                elems = {}
-                elems["vrijeme"] = node.xpath("simbol/text()")[0]
-                elems["Tmx"] = node.xpath("t_2m/text()")[0]
-                elems["wind"] = node.xpath("vjetar/text()")[0]
-                elems["precipitation"] = node.xpath("oborina/text()")[0]
-                elems["datetime"] = datetime.strptime(node.get("datum") + " " + node.get("sat"), "%d.%m.%Y. %H")
-                ret.append(elems)
-
-            # return data back
-            return ret
-
-        except HTTPError as err:
-            _LOGGER.error("HTTP error: %s", err.reason )
-        except URLError as err:
-            _LOGGER.error("URL error: %s", err.reason )
-        except etree.ParseError as err:
-            _LOGGER.error("LXML PARSE error: %s as position: %s, offset: %s, line: %s", err.msg, err.position, err.offset, err.lineno )
-        except etree.ParserError as err:
-            _LOGGER.error("LXML PARSER error: %s", err.message )
-        except etree.XMLSyntaxError as err:
-            _LOGGER.error("LXML XML SYNTAX error: %s as position: %s, offset: %s, line: %s", err.msg, err.position, err.offset, err.lineno )
-        except RemoteDisconnected as err:
-            _LOGGER.error("HTTP Remote end disconnected")
-
-    @Throttle(MIN_TIME_BETWEEN_UPDATES)
-    def update(self):
-        """Get the latest data from DHMZ."""
-        if self.last_update and (
-            self.last_update + timedelta(hours=1)
-            > datetime.now()
-        ):
-            _LOGGER.debug("Skipping sensor data update, last_update was: %s", self.last_update)
-            return  # Not time to update yet; data is only hourly
+            kolicina = precipitation["stations"].get(self._station_name)
+            if kolicina is not None:
+                ret["kolicina"] = kolicina
+                ret["kolicina_timestamp"] = precipitation["kolicina_timestamp"]
+
+        #return data back
+        return ret
+
+    def _forecast_day(self, daily):
+        """Look up the configured region and text in one prognoza_*.xml index."""
+        station = daily["stations"].get(self._forecast_region_name, {})
+        elems = {}
+        for param in ("vrijeme", "Tmx", "Tmn", "wind"):
+            elems[param] = station.get(param)
+        elems["text"] = daily["texts"].get(self._forecast_text)
+        elems["datetime"] = daily["datetime"]
+        if None in elems.values():
+            _LOGGER.warning("Incomplete DHMZ forecast for region %s, text %s", self._forecast_region_name, self._forecast_text)
+            return None
+        return elems
+
+    def forecast_daily(self, daily_today, daily_tomorrow):
+        """Look up the daily forecast in the prognoza_danas.xml and prognoza_sutra.xml indexes."""
+        if daily_today is None or daily_tomorrow is None:
+            return None
+
+        _LOGGER.debug("Refreshing forecast_daily - prognoza_danas.xml")
+        # get "prognoza_danas.xml"
+        elems = self._forecast_day(daily_today)
+
+        _LOGGER.debug("Refreshing forecast_daily - prognoza_sutra.xml")
+        # get "prognoza_sutra.xml"
+        elems_tm = self._forecast_day(daily_tomorrow)
+        if elems is None or elems_tm is None:
+            return None
+        elems_tm["datetime"] = elems_tm["datetime"] + timedelta(days=1)
+
+        # return data back
+        return [elems, elems_tm]
+
+    def forecast_hourly(self, forecast):
+        """Look up the forecast station in the streamed 7d_graf_i_simboli.xml."""
+        if forecast is None:
+            return None
+
+        _LOGGER.debug("Refreshing forecast_hourly -7d_graf_i_simboli.xml")
+        # get forecast weather "7d_graf_i_simboli.xml"
+        return forecast.get(self._forecast_station_name)
 
+    async def async_update(self):
+        """Get the latest data from DHMZ, refreshing the whole hub.
+
+        Cheap when no feed is due: the feed cache only downloads feeds whose
+        schedule says new data should be out, and returns the previous parse
+        for all others.
+        """
+        await self._hub.async_refresh()
+
+    def update(self, parsed):
+        """Update the snapshot from the {url: parsed feed} of one hub refresh.
+
+        Only the hub calls this, once per refresh. The new DhmzSnapshot is
+        built aside and swapped in with a single assignment, so readers see
+        either the previous update or this one, never a mix of both.
+        """
         _LOGGER.debug("Doing sensor data update, last_update was: %s", self.last_update)
-        # DHMZ's XML feeds are intermittently malformed or truncated; on a failed
-        # fetch/parse the helpers below return None. Keep the last good data in
-        # that case instead of overwriting it with None. Previously a None
-        # forecast propagated to _get_forecast() and raised "NoneType is not
-        # iterable", which aborted the entity's state write and left the card and
+
+        # DHMZ's XML feeds are intermittently malformed or truncated; a failed
+        # fetch/parse comes back as None. Keep the last good data in that case
+        # instead of overwriting it with None. Previously a None forecast
+        # propagated to _get_forecast() and raised "NoneType is not iterable",
+        # which aborted the entity's state write and left the card and
         # more-info dialog stuck on a spinner until the next good poll.
-        new_current = self.current_situation()
-        if new_current:
-            self._current_situation = new_current
-            for dataline in self._current_situation:
-                self._data[dataline.tag] = dataline.text.strip()
-
-        new_daily = self.forecast_daily()
-        if new_daily:
-            self._forecast_daily = new_daily
-            self._data["PrognozaDanas"] = self._forecast_daily[0]["text"]
-            self._data["PrognozaSutra"] = self._forecast_daily[1]["text"]
-
-        new_hourly = self.forecast_hourly()
-        if new_hourly:
-            self._forecast_hourly = new_hourly
-
-        _LOGGER.debug("Sensor, current data: %s", self._data)
-        # _LOGGER.debug("DHMZ Sensor, current forecast daily: %s", self._forecast_daily)
-        # _LOGGER.debug("DHMZ Sensor, current forecast hourly: %s", self._forecast_hourly)
+        # An unchanged feed comes back as the very same parse result, and
+        # nothing derived from it is rebuilt.
+        changed = {
+            url for url, result in parsed.items()
+            if result is not None and result is not self._parsed.get(url)
+        }
+        if not changed:
+            _LOGGER.debug("Feeds unchanged, keeping current data")
+            return
+        for url in changed:
+            self._parsed[url] = parsed[url]
+
+        data = dict(self._snapshot.data)
+        forecast_daily = self._snapshot.forecast_daily
+        forecast_hourly = self._snapshot.forecast_hourly
+
+        if changed & {CURRENT_SITUATION_API_URL, PRECIPITATION_API_URL}:
+            new_current = self.current_situation(self._parsed.get(CURRENT_SITUATION_API_URL), self._parsed.get(PRECIPITATION_API_URL))
+            if new_current:
+                data.update(new_current)
+
+        if changed & {FORECAST_TODAY_API_URL, FORECAST_TOMORROW_API_URL}:
+            new_daily = self.forecast_daily(self._parsed.get(FORECAST_TODAY_API_URL), self._parsed.get(FORECAST_TOMORROW_API_URL))
+            if new_daily:
+                forecast_daily = new_daily
+                data["PrognozaDanas"] = forecast_daily[0]["text"]
+                data["PrognozaSutra"] = forecast_daily[1]["text"]
+
+        if FORECAST_7DAYS_API_URL in changed:
+            new_hourly = self.forecast_hourly(self._parsed[FORECAST_7DAYS_API_URL])
+            if new_hourly:
+                forecast_hourly = new_hourly
+
+        self._snapshot = DhmzSnapshot(data, forecast_daily, forecast_hourly)
+
+        _LOGGER.debug("Sensor, current data: %s", data)
+        # _LOGGER.debug("DHMZ Sensor, current forecast daily: %s", forecast_daily)
+        # _LOGGER.debug("DHMZ Sensor, current forecast hourly: %s", forecast_hourly)
 
         _LOGGER.debug("Updating - finished.")
 
     def get_data(self, variable):
         """Get the data."""
-        return self._data.get(variable)
+        return self._snapshot.data.get(variable)
 
     def get_forecast_daily(self):
         """Get the data."""
-        return self._forecast_daily
+        return self._snapshot.forecast_daily
 
     def get_forecast_hourly(self):
         """Get the data."""
-        return self._forecast_hourly
+        return self._snapshot.forecast_hourly
 
 def get_dhmz_stations():
     """Return {CONF_STATION: (lat, lon)} for all stations, for auto-config."""
 
     stations={}
-    tree = etree.parse(urlopen(CURRENT_SITUATION_API_URL))
-    elems = tree.xpath("//Hrvatska/Grad")
-    for elem in elems:
-        ime = elem.xpath("GradIme")[0]
-        lon = elem.xpath("Lon")[0]
-        lat = elem.xpath("Lat")[0]
-        stations[ime.text] = (float(lat.text), float(lon.text))
+    current = parse_current_situation(urlopen(CURRENT_SITUATION_API_URL))
+    for ime, record in current["stations"].items():
+        stations[ime] = (float(record["Lat"]), float(record["Lon"]))
 
     return stations
 
@@ -0,0 +1,23 @@
+"""Services of the DHMZ integration."""
+from homeassistant.core import SupportsResponse
+
+from . import DOMAIN
+from .feed import get_feed_cache
+from .metrics import get_metrics
+
+SERVICE_DIAGNOSTICS = "diagnostics"
+
+
+def async_setup_services(hass):
+    """Register the DHMZ services."""
+
+    async def async_diagnostics(call):
+        """Return the feed schedules and the performance metrics."""
+        return {
+            "feeds": get_feed_cache(hass).diagnostics(),
+            "metrics": get_metrics(hass).as_dict(),
+        }
+
+    hass.services.async_register(
+        DOMAIN, SERVICE_DIAGNOSTICS, async_diagnostics, supports_response=SupportsResponse.ONLY
+    )
@@ -0,0 +1,25 @@
+"""Single-flight tasks of the DHMZ integration."""
+import asyncio
+
+
+class SingleFlight:
+    """
+    Tasks in flight by key.
+
+    Callers asking for a key that already has a task in flight join it and
+    share its result, instead of starting the same work again. The task is
+    forgotten once it is done, the next caller starts a new one.
+    """
+
+    def __init__(self):
+        """Initialize without tasks in flight."""
+        self._tasks = {}
+
+    def async_run(self, hass, key, target, *args):
+        """Return an awaitable of the task in flight for key, starting target(*args) if there is none."""
+        task = self._tasks.get(key)
+        if task is None:
+            task = self._tasks[key] = hass.async_create_task(target(*args))
+            task.add_done_callback(lambda _: self._tasks.pop(key, None))
+        # a cancelled caller must not cancel the task for the others
+        return asyncio.shield(task)
@@ -1,7 +1,6 @@
 """Sensor for data from DHMZ."""
 import logging
-from operator import itemgetter
-from datetime import timedelta, datetime
+from datetime import datetime
 import voluptuous as vol
 
 from homeassistant.components.weather import (
@@ -23,8 +22,11 @@ from homeassistant.components.weather import (
     WeatherEntityFeature
 )
 from homeassistant.const import CONF_NAME, UnitOfTemperature, UnitOfPressure, UnitOfSpeed, UnitOfPrecipitationDepth
+from homeassistant.core import callback
+from homeassistant.exceptions import PlatformNotReady
 from homeassistant.helpers import config_validation as cv
 from homeassistant.helpers.restore_state import RestoreEntity
+from homeassistant.helpers.update_coordinator import CoordinatorEntity
 
 # Reuse data and API logic from the sensor implementation
 from .sensor import (
@@ -33,10 +35,10 @@ from .sensor import (
     CONF_FORECAST_REGION_NAME,
     CONF_FORECAST_TEXT,
     CONF_FORECAST_STATION_NAME,
-    DhmzData,
     SENSOR_TYPES,
     ATTR_STATION,
     ATTR_UPDATED,
+    get_dhmz_hub,
 )
 
 CONDITION_CLASSES = {
@@ -57,6 +59,12 @@ CONDITION_CLASSES = {
     "exceptional": ["-"],
 }
 
+# Reverse of CONDITION_CLASSES, symbol -> condition
+SYMBOL_CONDITIONS = {}
+for _condition, _symbols in CONDITION_CLASSES.items():
+    for _symbol in _symbols:
+        SYMBOL_CONDITIONS.setdefault(_symbol, _condition)
+
 WIND_MAPPING = {
     0: ("-", 0),
     1: ("N", 10),
@@ -104,9 +112,11 @@ PLATFORM_SCHEMA = PLATFORM_SCHEMA.extend(
     }
 )
 
-SCAN_INTERVAL = timedelta(minutes=10)
+def _value(value):
+    """Return None for a value missing from the forecast, stored as NaN."""
+    return None if value != value else value
 
-def setup_platform(hass, config, add_entities, discovery_info=None):
+async def async_setup_platform(hass, config, async_add_entities, discovery_info=None):
     """Set up the DHMZ weather platform."""
     name = config.get(CONF_NAME)
     station_name = config.get(CONF_STATION_NAME)
@@ -116,20 +126,20 @@ def setup_platform(hass, config, add_entities, discovery_info=None):
 
     _LOGGER.debug("Setup weather platform: %s, %s, %s, %s",  station_name, forecast_region_name, forecast_text, forecast_station_name )
 
-    probe = DhmzData(station_name=station_name, forecast_region_name=forecast_region_name, forecast_text=forecast_text, forecast_station_name=forecast_station_name)
-    try:
-        probe.update()
-    except (ValueError, TypeError) as err:
-        _LOGGER.error("Received error from DHMZ: %s", err)
-        return False
+    hub = get_dhmz_hub(hass)
+    probe = hub.get_data(station_name=station_name, forecast_region_name=forecast_region_name, forecast_text=forecast_text, forecast_station_name=forecast_station_name)
+    await probe.async_update()
+    if not hub.last_update_success:
+        raise PlatformNotReady("Received no data from DHMZ")
 
-    add_entities([DhmzWeather(probe, name)], True)
+    async_add_entities([DhmzWeather(hub, probe, name)])
 
-class DhmzWeather(WeatherEntity, RestoreEntity):
+class DhmzWeather(CoordinatorEntity, WeatherEntity, RestoreEntity):
     """Representation of a weather condition."""
 
-    def __init__(self, dhmz_data, name):
+    def __init__(self, hub, dhmz_data, name):
         """Initialise the platform with a data instance and station name."""
+        super().__init__(hub)
         _LOGGER.debug("Initialized.")
         self.dhmz_data = dhmz_data
         self._name = name
@@ -137,9 +147,15 @@ class DhmzWeather(WeatherEntity, RestoreEntity):
         # which happens routinely at night. Persist the last known-good symbol so
         # the condition/icon don't flip to "exceptional" (see _resolve_symbol).
         self._last_good_symbol = None
+        # Converted hourly forecast, rebuilt only when DhmzData replaces its
+        # HourlyForecast, in the same order as its slots
+        self._forecast_source = None
+        self._forecast = []
         self._symbol = self._resolve_symbol()
         self._state = self.format_condition(self._symbol)
         self._last_update = self.dhmz_data.last_update
+        # Snapshot and availability the state was last written for
+        self._written = None
 
     def _resolve_symbol(self):
         """Return the effective weather symbol, keeping the last known-good one.
@@ -165,18 +181,26 @@ class DhmzWeather(WeatherEntity, RestoreEntity):
                 self._last_good_symbol = sym
                 self._symbol = self._resolve_symbol()
                 self._state = self.format_condition(self._symbol)
+        self._written = (self.available, self.dhmz_data.snapshot)
 
-    def update(self):
-        """Update current conditions."""
+    @callback
+    def _handle_coordinator_update(self):
+        """Update current conditions, writing the state only if the data changed."""
         _LOGGER.debug("Update - called.")
-        self.dhmz_data.update()
-        if self._last_update != self.dhmz_data.last_update:
+        snapshot = self.dhmz_data.snapshot
+        if (self.available, snapshot) == self._written:
+            _LOGGER.debug("Update - no update found.")
+            return
+        hourly_changed = self._written is None or snapshot.forecast_hourly is not self._written[1].forecast_hourly
+        self._written = (self.available, snapshot)
+        if self._last_update != snapshot.last_update:
             _LOGGER.debug("Update - updated last date found.")
-            self._last_update = self.dhmz_data.last_update
+            self._last_update = snapshot.last_update
             self._symbol = self._resolve_symbol()
             self._state = self.format_condition(self._symbol)
-        else:
-            _LOGGER.debug("Update - no update found.")
+        self.async_write_ha_state()
+        if hourly_changed:
+            self.hass.async_create_task(self.async_update_listeners(("hourly",)))
 
     @property
     def supported_features(self) -> WeatherEntityFeature:
@@ -212,15 +236,17 @@ class DhmzWeather(WeatherEntity, RestoreEntity):
     @property
     def extra_state_attributes(self):
         """Return the state attributes."""
+        snapshot = self.dhmz_data.snapshot
+        data = snapshot.data
         ret = {
-            "condition": self.dhmz_data.get_data(SENSOR_TYPES["condition"][4]),
+            "condition": data.get(SENSOR_TYPES["condition"][4]),
             "weather_symbol": self._symbol,
-            ATTR_STATION: self.dhmz_data.get_data(SENSOR_TYPES["station_name"][4]),
-            ATTR_UPDATED: self.dhmz_data.last_update.isoformat(),
-            "pressure_tendency": self.dhmz_data.get_data(SENSOR_TYPES["pressure_tendency"][4]),
-            "precipitation": self.dhmz_data.get_data(SENSOR_TYPES["precipitation"][4]) if self.dhmz_data.get_data(SENSOR_TYPES["precipitation"][4]) else "0",
-            "forecast_today": self.dhmz_data.get_data(SENSOR_TYPES["forecast_text_today"][4]),
-            "forecast_tomorrow": self.dhmz_data.get_data(SENSOR_TYPES["forecast_text_tomorrow"][4]),
+            ATTR_STATION: data.get(SENSOR_TYPES["station_name"][4]),
+            ATTR_UPDATED: snapshot.last_update.isoformat(),
+            "pressure_tendency": data.get(SENSOR_TYPES["pressure_tendency"][4]),
+            "precipitation": data.get(SENSOR_TYPES["precipitation"][4]) or "0",
+            "forecast_today": data.get(SENSOR_TYPES["forecast_text_today"][4]),
+            "forecast_tomorrow": data.get(SENSOR_TYPES["forecast_text_tomorrow"][4]),
             "forecast_list": self._get_forecast(),
         }
         return(ret)
@@ -308,37 +334,44 @@ class DhmzWeather(WeatherEntity, RestoreEntity):
     @staticmethod
     def format_condition(weather_symbol):
         """Return condition from dict CONDITION_CLASSES."""
-        try:
-            s_ret = [ k for k, v in CONDITION_CLASSES.items() if weather_symbol in v][0]
-            return s_ret
-        except IndexError as err:
+        s_ret = SYMBOL_CONDITIONS.get(weather_symbol)
+        if s_ret is None:
             _LOGGER.warning("Unknown DHMZ weather symbol: %s", weather_symbol )
             return "exceptional"
+        return s_ret
 
-    def _get_forecast(self) -> list[Forecast]:
-        ret = []
-        for entry in (self.dhmz_data.get_forecast_hourly() or []):
-            if entry.get("datetime") > datetime.now():
-                try:
-                    s_cond = [ k for k, v in CONDITION_CLASSES.items() if entry.get("vrijeme") in v ][0]
-                except IndexError as err:
-                    _LOGGER.warning("Unknown DHMZ weather symbol: %s", entry.get("vrijeme") )
-                    s_cond = "exceptional"
-                elem = {
-                    ATTR_FORECAST_TIME: entry.get("datetime"),
-                    ATTR_FORECAST_TEMP: float(entry.get("Tmx")),
-                    ATTR_FORECAST_PRECIPITATION: float(entry.get("precipitation")),
-                    ATTR_FORECAST_WIND_SPEED: WIND_SPEED_MAPPING[int(entry.get("wind")[-1:])],
-                    ATTR_FORECAST_WIND_BEARING: entry.get("wind")[:-1],
-                    ATTR_FORECAST_CONDITION: s_cond,
-                    "weather_symbol": entry.get("vrijeme"),
-                }
-                ret.append(elem)
-        if len(ret) == 0:
-            retlist = None
+    def _build_forecast(self, hourly):
+        """Convert the hourly forecast once per data change, sorted by time."""
+        if not hourly:
+            ret = []
         else:
-            retlist = sorted(ret, key=itemgetter(ATTR_FORECAST_TIME)) 
-        return retlist
+            # HourlyForecast columns are already converted and sorted by time
+            ret = [
+                {
+                    ATTR_FORECAST_TIME: time,
+                    ATTR_FORECAST_TEMP: _value(temperature),
+                    ATTR_FORECAST_PRECIPITATION: _value(precipitation),
+                    ATTR_FORECAST_WIND_SPEED: WIND_SPEED_MAPPING[wind_speed],
+                    ATTR_FORECAST_WIND_BEARING: wind_bearing,
+                    ATTR_FORECAST_CONDITION: self.format_condition(symbol),
+                    "weather_symbol": symbol,
+                }
+                for time, temperature, precipitation, wind_speed, wind_bearing, symbol in zip(
+                    hourly.datetimes, hourly.temperature, hourly.precipitation, hourly.wind_speed, hourly.wind_bearing, hourly.symbol
+                )
+            ]
+        self._forecast = ret
+        self._forecast_source = hourly
+
+    def _get_forecast(self) -> list[Forecast]:
+        hourly = self.dhmz_data.get_forecast_hourly()
+        if hourly is not self._forecast_source:
+            self._build_forecast(hourly)
+        # Only slots still in the future
+        start = hourly.index_after(datetime.now()) if hourly else 0
+        if start == len(self._forecast):
+            return None
+        return self._forecast[start:]
 
     async def async_forecast_hourly(self) -> list[Forecast]:
         return self._get_forecast()
@@ -0,0 +1,128 @@
+"""Tests of the DHMZ radar source."""
+import asyncio
+from unittest.mock import patch
+
+# Home Assistant sets up http before any camera platform, importing the
+# camera component first is a circular import
+import homeassistant.helpers.aiohttp_client  # noqa: F401
+
+from custom_components.dhmz import camera
+
+
+class FakeResponse:
+    """Response of FakeFrameServer."""
+
+    def __init__(self, status, body, etag):
+        self.status = status
+        self._body = body
+        self.headers = {"etag": etag}
+
+    def raise_for_status(self):
+        pass
+
+    async def read(self):
+        return self._body
+
+
+class FakeFrameServer:
+    """Serves the radar frames at positional URLs, the newest one last."""
+
+    def __init__(self):
+        self.published = 0
+        self.frames = []
+        self.downloads = []
+        for _ in range(camera.RADAR_MAP_FRAMES):
+            self.publish()
+        self.downloads.clear()
+
+    def publish(self):
+        self.published += 1
+        self.frames = self.frames[-(camera.RADAR_MAP_FRAMES - 1):] + [b"frame %d" % self.published]
+
+    async def get(self, url, headers=None, **kwargs):
+        index = int(url.rsplit("anim_kompozit", 1)[1].split(".")[0]) - 1
+        body = self.frames[index]
+        etag = '"%s"' % body.decode()
+        if (headers or {}).get("If-None-Match") == etag:
+            return FakeResponse(304, b"", etag)
+        self.downloads.append(index)
+        return FakeResponse(200, body, etag)
+
+
+class FakeHass:
+    """The parts of Home Assistant the radar source uses."""
+
+    def __init__(self):
+        self.data = {}
+
+    def async_create_task(self, target):
+        return asyncio.get_running_loop().create_task(target)
+
+
+def _fetch(server, source, publish):
+    async def run():
+        with patch.object(camera, "async_get_clientsession", lambda hass: server):
+            for _ in range(publish):
+                server.publish()
+            return await source.async_fetch_frames()
+    return asyncio.run(run())
+
+
+def test_frames_ring_buffer():
+    """A new frame is the only one downloaded, the others are shifted."""
+    server = FakeFrameServer()
+    source = camera.DhmzRadarSource(FakeHass())
+
+    assert _fetch(server, source, 0)
+    assert len(server.downloads) == camera.RADAR_MAP_FRAMES
+    assert list(source.frames) == server.frames
+
+    server.downloads.clear()
+    assert _fetch(server, source, 0)
+    assert server.downloads == []
+
+    assert _fetch(server, source, 1)
+    # the new frame only, the one before it is revalidated with a 304
+    assert server.downloads == [camera.RADAR_MAP_FRAMES - 1]
+    assert list(source.frames) == server.frames
+
+
+def test_frames_fetched_again_when_not_shifted_by_one():
+    """After more than one publication, every changed frame is downloaded."""
+    server = FakeFrameServer()
+    source = camera.DhmzRadarSource(FakeHass())
+    _fetch(server, source, 0)
+
+    server.downloads.clear()
+    assert _fetch(server, source, 3)
+    assert sorted(server.downloads) == list(range(camera.RADAR_MAP_FRAMES))
+    assert list(source.frames) == server.frames
+
+
+def test_jpeg_frames_of_new_image_version():
+    """A new image version is encoded at once, not after the encode of the previous one."""
+    async def run():
+        radar = camera.DhmzRadar("Radar", 60, 500, 1000, 45.8, 15.9, False, "gif")
+        radar.hass = FakeHass()
+        release = asyncio.Event()
+        encoded = []
+
+        async def encode(target, image):
+            if image == b"first":
+                await release.wait()
+            encoded.append(image)
+            return [(image, 100)]
+        radar._async_run = encode
+
+        radar._set_image(b"first")
+        first = asyncio.ensure_future(radar._async_jpeg_frames())
+        await asyncio.sleep(0)
+        radar._set_image(b"second")
+        second = await asyncio.wait_for(radar._async_jpeg_frames(), 1)
+        release.set()
+        return await first, second, encoded
+
+    first, second, encoded = asyncio.run(run())
+    assert second == [(b"second", 100)]
+    assert first == [(b"first", 100)]
+    assert encoded == [b"second", b"first"]
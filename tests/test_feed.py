@@ -0,0 +1,103 @@
+"""Tests of the DHMZ feed cache."""
+import asyncio
+from unittest.mock import patch
+
+import pytest
+
+from custom_components.dhmz import feed
+from custom_components.dhmz.parser import parse_forecast_daily
+
+URL = "https://prognoza.hr/prognoza_danas.xml"
+
+FORECAST = (
+    b'<?xml version="1.0" encoding="UTF-8"?>'
+    b"<VW><metadata><datatime>%s</datatime></metadata><section>"
+    b'<station name="sredisnja"><param name="vrijeme" value="2"/></station>'
+    b"</section></VW>"
+)
+
+
+class FakeResponse:
+    """Response of FakeSession, always a complete 200."""
+
+    status = 200
+
+    def __init__(self, body):
+        self._body = body
+        self.headers = {}
+        self.content_length = len(body)
+
+    def raise_for_status(self):
+        pass
+
+    async def read(self):
+        return self._body
+
+
+class FakeSession:
+    """Client session serving the bodies queued for each URL."""
+
+    def __init__(self, bodies):
+        self.bodies = bodies
+
+    async def get(self, url, **kwargs):
+        return FakeResponse(self.bodies[url].pop(0))
+
+
+class FakeHass:
+    """The parts of Home Assistant the feed cache uses."""
+
+    def __init__(self):
+        self.data = {}
+
+    async def async_add_executor_job(self, target, *args):
+        return target(*args)
+
+
+def _get_many(bodies, parsers):
+    async def run():
+        cache = feed.DhmzFeedCache(FakeHass())
+        with patch.object(feed, "async_get_clientsession", lambda hass: FakeSession(bodies)):
+            return cache, await cache.async_get_many(parsers)
+    return asyncio.run(run())
+
+
+def test_parser_error_fails_only_its_feed():
+    """A value the parser rejects fails that feed, the others are returned."""
+    other = "https://prognoza.hr/prognoza_sutra.xml"
+    bodies = {URL: [FORECAST % b"not a date"], other: [FORECAST % b"181026"]}
+    cache, results = _get_many(bodies, {URL: (parse_forecast_daily,), other: (parse_forecast_daily,)})
+
+    assert results[URL] is None
+    assert results[other]["stations"]["sredisnja"]["vrijeme"] == "2"
+    failed = cache._feed(URL)
+    assert failed.body is None
+    assert failed.schedule.next_poll is not None
+
+
+@pytest.mark.parametrize("body", [
+    b'<?xml version="1.0"?><a><b/></a>',
+    b"<a><b/></a>\r\n",
+    b"<a/>",
+    b"<a><b/></a><!-- generated -->",
+    b"<a><b/></a>\n<!-- generated -->\n<?cache hit?>\n",
+    b"<a/><?cache hit?>",
+])
+def test_is_complete(body):
+    """Documents that close their root element, whatever follows it."""
+    assert feed.is_complete(body)
+
+
+@pytest.mark.parametrize("body", [
+    b"",
+    b'<?xml version="1.0"?>',
+    b"<a><b/>",
+    b"<a><b/></",
+    b"<a><b/></a><!-- generated",
+    b"<a><b/><!-- generated -->",
+    b"<a><b/><?cache hit?>",
+    b"<!-- <a></a> -->",
+])
+def test_is_complete_truncated(body):
+    """Documents cut off before the root element was closed."""
+    assert not feed.is_complete(body)
@@ -0,0 +1,137 @@
+"""Tests of the columnar hourly forecast."""
+from datetime import date, datetime
+import math
+
+import pytest
+
+from custom_components.dhmz import forecast
+from custom_components.dhmz.forecast import HourlyForecast
+
+
+@pytest.fixture(autouse=True, params=["numpy", "array"])
+def vectorized(request, monkeypatch):
+    """Run every test with and without NumPy."""
+    if request.param == "numpy":
+        pytest.importorskip("numpy")
+    else:
+        monkeypatch.setattr(forecast, "np", None)
+    return request.param
+
+
+def _forecast(temperature, precipitation):
+    return HourlyForecast.from_strings(
+        ["18.10.2026."] * 3, ["0", "3", "6"], temperature, precipitation, ["N1", "NE2", "E0"], ["1", "2n", "3"]
+    )
+
+
+def test_from_strings():
+    """Values are converted into columns."""
+    hourly = _forecast(["5", "6", "-1"], ["0.0", "1.5", "0.2"])
+
+    assert len(hourly) == 3
+    assert hourly.datetimes == tuple(datetime(2026, 10, 18, hour) for hour in (0, 3, 6))
+    assert list(hourly.temperature) == [5, 6, -1]
+    assert list(hourly.precipitation) == [0, 1.5, 0.2]
+    assert list(hourly.wind_speed) == [1, 2, 0]
+    assert hourly.wind_bearing == ("N", "NE", "E")
+    assert hourly.symbol == ("1", "2n", "3")
+
+
+def test_from_strings_missing_values():
+    """A missing or empty temperature or precipitation is stored as NaN."""
+    hourly = _forecast([None, "", " 4 "], ["", "0.5", None])
+
+    assert [math.isnan(value) for value in hourly.temperature] == [True, True, False]
+    assert hourly.temperature[2] == 4
+    assert [math.isnan(value) for value in hourly.precipitation] == [True, False, True]
+
+
+def test_from_strings_sorts_by_time():
+    """Slots are sorted by time, whatever order the feed lists them in."""
+    hourly = HourlyForecast.from_strings(
+        ["19.10.2026.", "18.10.2026."], ["0", "21"], ["3", "7"], ["0", "1"], ["S1", "W2"], ["4", "5n"]
+    )
+
+    assert hourly.datetimes == (datetime(2026, 10, 18, 21), datetime(2026, 10, 19, 0))
+    assert list(hourly.temperature) == [7, 3]
+    assert hourly.wind_bearing == ("W", "S")
+
+
+def test_index_after():
+    """The first slot later than a moment, as the weather entity shows from."""
+    hourly = _forecast(["5", "6", "-1"], ["0.0", "1.5", "0.2"])
+
+    assert hourly.index_after(datetime(2026, 10, 17, 23)) == 0
+    assert hourly.index_after(datetime(2026, 10, 18, 3)) == 2
+    assert hourly.index_after(datetime(2026, 10, 18, 3, 1)) == 2
+    assert hourly.index_after(datetime(2026, 10, 18, 6)) == 3
+
+
+def test_immutable():
+    """Neither the store nor its columns can be modified."""
+    hourly = _forecast(["5", "6", "-1"], ["0.0", "1.5", "0.2"])
+
+    with pytest.raises(AttributeError):
+        hourly.temperature = None
+    with pytest.raises(TypeError):
+        hourly.temperature[0] = 20
+    with pytest.raises(TypeError):
+        hourly.symbol[0] = "2"
+
+
+def test_from_strings_invalid_values():
+    """Values that are not numbers are rejected, the feed cache then fails the feed."""
+    with pytest.raises(ValueError):
+        _forecast(["5", "warm", "-1"], ["0.0", "1.5", "0.2"])
+    with pytest.raises((ValueError, TypeError)):
+        HourlyForecast.from_strings(["18.10.2026."], ["0"], ["5"], ["0"], ["N"], ["1"])
+
+
+def _week():
+    """Three days, the second one with missing values."""
+    dates = ["18.10.2026."] * 8 + ["19.10.2026."] * 8 + ["20.10.2026."] * 8
+    hours = [str(hour) for hour in range(0, 24, 3)] * 3
+    temperature = [str(value) for value in range(8)] + ["", "4", None, "9", "-2", "", "1", "3"] + [""] * 8
+    precipitation = ["0.5"] * 8 + ["1", "", "2", "", "", "", "", "0.5"] + [None] * 8
+    return HourlyForecast.from_strings(dates, hours, temperature, precipitation, ["N1"] * 24, ["2"] * 24)
+
+
+def test_daily_aggregates():
+    """Per day aggregates leave missing values out, a day without any is NaN."""
+    hourly = _week()
+
+    highest = hourly.daily_max_temperature()
+    lowest = hourly.daily_min_temperature()
+    precipitation = hourly.daily_precipitation()
+
+    assert list(highest) == [date(2026, 10, 18), date(2026, 10, 19), date(2026, 10, 20)]
+    assert highest[date(2026, 10, 18)] == 7
+    assert highest[date(2026, 10, 19)] == 9
+    assert math.isnan(highest[date(2026, 10, 20)])
+    assert lowest[date(2026, 10, 19)] == -2
+    assert math.isnan(lowest[date(2026, 10, 20)])
+    assert precipitation[date(2026, 10, 18)] == 4
+    assert precipitation[date(2026, 10, 19)] == 3.5
+    assert math.isnan(precipitation[date(2026, 10, 20)])
+
+
+def test_daily_aggregates_empty():
+    """A forecast without slots has no days."""
+    hourly = HourlyForecast.from_strings([], [], [], [], [], [])
+
+    assert len(hourly) == 0
+    assert hourly.daily_max_temperature() == {}
+
+
+def test_next_hours():
+    """The slots later than a moment and up to the given hours after it."""
+    hourly = _week()
+
+    window = hourly.next_hours(datetime(2026, 10, 18, 22))
+
+    assert window.datetimes[0] == datetime(2026, 10, 19, 0)
+    assert window.datetimes[-1] == datetime(2026, 10, 19, 21)
+    assert len(window) == 8
+    assert list(window.wind_speed) == [1] * 8
+    assert window.daily_max_temperature() == {date(2026, 10, 19): 9}
+    assert len(hourly.window(datetime(2026, 10, 21), datetime(2026, 10, 22))) == 0
@@ -0,0 +1,79 @@
+"""Tests of the DHMZ hub."""
+import asyncio
+
+from homeassistant.core import HomeAssistant
+
+from custom_components.dhmz import sensor
+
+
+class FakeFeeds:
+    """Feed cache whose 7 day forecast lists the stations it was parsed for."""
+
+    def __init__(self):
+        self.fetched = asyncio.Event()
+        self.release = asyncio.Event()
+
+    @staticmethod
+    def _forecast(stations):
+        return {code: "forecast of " + code for code in stations}
+
+    async def async_get_many(self, parsers):
+        self.fetched.set()
+        await self.release.wait()
+        ret = dict.fromkeys(parsers)
+        ret[sensor.FORECAST_7DAYS_API_URL] = self._forecast(parsers[sensor.FORECAST_7DAYS_API_URL][1])
+        return ret
+
+    async def async_get(self, url, parser, stations):
+        return self._forecast(stations)
+
+    def next_poll(self):
+        return None
+
+
+def test_station_registered_during_refresh(tmp_path):
+    """A forecast station registered while a refresh runs gets its forecast from it."""
+    async def run():
+        hass = HomeAssistant(str(tmp_path))
+        feeds = FakeFeeds()
+        hub = sensor.DhmzHub(hass, feeds)
+        first = hub.get_data("Zagreb-Maksimir", "sredisnja", "zg_text", "ZAGREB-MAKSIMIR")
+        refresh = asyncio.ensure_future(first.async_update())
+        await feeds.fetched.wait()
+
+        second = hub.get_data("Split-Marjan", "dalmacija", "st_text", "SPLIT-MARJAN")
+        joined = asyncio.ensure_future(second.async_update())
+        await asyncio.sleep(0)
+        feeds.release.set()
+        await asyncio.gather(refresh, joined)
+        await hass.async_stop(force=True)
+        return first, second
+
+    first, second = asyncio.run(run())
+    assert first.get_forecast_hourly() == "forecast of ZAGREB-MAKSIMIR"
+    assert second.get_forecast_hourly() == "forecast of SPLIT-MARJAN"
+
+
+class FailingFeeds(FakeFeeds):
+    """Feed cache for which every feed fails."""
+
+    async def async_get_many(self, parsers):
+        return dict.fromkeys(parsers)
+
+
+def test_every_feed_failed(tmp_path):
+    """A refresh without any feed fails, the entities are unavailable."""
+    async def run():
+        hass = HomeAssistant(str(tmp_path))
+        hub = sensor.DhmzHub(hass, FailingFeeds())
+        probe = hub.get_data("Zagreb-Maksimir", "sredisnja", "zg_text", "ZAGREB-MAKSIMIR")
+        await probe.async_update()
+        entity = sensor.DhmzSensor(hub, probe, "forecast_text_today", "DHMZ")
+        await hass.async_stop(force=True)
+        return hub, entity
+
+    hub, entity = asyncio.run(run())
+    assert not hub.last_update_success
+    assert not entity.available
+    assert entity.state is None
+    assert entity._value() is None
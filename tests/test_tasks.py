@@ -0,0 +1,41 @@
+"""Tests of the single-flight tasks."""
+import asyncio
+
+from custom_components.dhmz.tasks import SingleFlight
+
+
+class FakeHass:
+    """The parts of Home Assistant single-flight tasks use."""
+
+    def async_create_task(self, target):
+        return asyncio.get_running_loop().create_task(target)
+
+
+def test_single_flight():
+    """Callers of a key share one task, a cancelled caller does not cancel it for the others."""
+    async def run():
+        hass = FakeHass()
+        flight = SingleFlight()
+        release = asyncio.Event()
+        started = []
+
+        async def work(key):
+            started.append(key)
+            await release.wait()
+            return key
+
+        cancelled = asyncio.ensure_future(flight.async_run(hass, "a", work, "a"))
+        joined = asyncio.ensure_future(flight.async_run(hass, "a", work, "a"))
+        other = asyncio.ensure_future(flight.async_run(hass, "b", work, "b"))
+        await asyncio.sleep(0)
+        cancelled.cancel()
+        release.set()
+        results = await asyncio.gather(joined, other)
+        again = await flight.async_run(hass, "a", work, "a")
+        return cancelled.cancelled(), results, again, started
+
+    cancelled, results, again, started = asyncio.run(run())
+    assert cancelled
+    assert results == ["a", "b"]
+    assert again == "a"
+    assert started == ["a", "b", "a"]